@@ -25,7 +25,7 @@ __copyright__ = "Copyright 2021-2022 mundialis GmbH & Co. KG"
 __maintainer__ = "mundialis GmbH % Co. KG"
 
 from flask_restful_swagger_2 import swagger
-from flask import make_response, jsonify
+from flask import make_response, jsonify, request, g
 
 from actinia_core.models.response_models import \
     SimpleResponseModel
@@ -33,8 +33,14 @@ from actinia_core.rest.resource_management import ResourceManagerBase
 
 from actinia_parallel_plugin.resources.logging import log
 from actinia_parallel_plugin.core.batches import (
+    BATCH_RESPONSE_FIELDS,
     createBatchResponseDict,
+    createBatchSummaryResponseDict,
     getJobsByBatchId,
+    pauseBatch,
+    releaseJobs,
+    rerunBatch,
+    terminateBatch,
 )
 from actinia_parallel_plugin.apidocs import batch
 
@@ -45,6 +51,7 @@ class BatchJobsId(ResourceManagerBase):
 
     Contains HTTP GET endpoint
     Contains HTTP POST endpoint
+    Contains HTTP DELETE endpoint
     Contains swagger documentation
     """
     @swagger.doc(batch.batchjobId_get_docs)
@@ -61,8 +68,13 @@ class BatchJobsId(ResourceManagerBase):
         log.info(("\n Received HTTP GET request for batch"
                   f" with id {str(batchid)}"))
 
-        jobs = getJobsByBatchId(batchid)
-        if len(jobs) == 0:
+        if request.args.get("summary", "false").lower() == "true":
+            # only the status counts without the job payloads
+            resp_dict = createBatchSummaryResponseDict(batchid)
+        else:
+            jobs = getJobsByBatchId(batchid, BATCH_RESPONSE_FIELDS)
+            resp_dict = createBatchResponseDict(jobs)
+        if len(resp_dict) == 0:
             res = (jsonify(SimpleResponseModel(
                         status=404,
                         message='Either batchid does not exist or there was a '
@@ -71,7 +83,6 @@ class BatchJobsId(ResourceManagerBase):
                    )))
             return make_response(res, 404)
         else:
-            resp_dict = createBatchResponseDict(jobs)
             return make_response(jsonify(resp_dict), 200)
 
     # no docs because 405
@@ -81,3 +92,143 @@ class BatchJobsId(ResourceManagerBase):
             message="Method Not Allowed"
         ))
         return make_response(res, 405)
+
+    @swagger.doc(batch.batchjobId_delete_docs)
+    def delete(self, user_id, batchid):
+        """Cancel all jobs of a batch which did not finish yet."""
+
+        ret = self.check_permissions(user_id=user_id)
+        if ret:
+            return ret
+
+        if batchid is None:
+            return make_response("No batchid was given", 400)
+
+        log.info(("\n Received HTTP DELETE request for batch"
+                  f" with id {str(batchid)}"))
+
+        jobs, err = terminateBatch(batchid, user_id)
+        if jobs is None:
+            res = (jsonify(SimpleResponseModel(
+                        status=err["status"],
+                        message=err["msg"]
+                   )))
+            return make_response(res, err["status"])
+
+        all_jobs = getJobsByBatchId(batchid, BATCH_RESPONSE_FIELDS)
+        return make_response(jsonify(createBatchResponseDict(all_jobs)), 200)
+
+
+class BatchJobsRerun(ResourceManagerBase):
+    """ Definition for endpoint
+    @app.route('/resources/<string:user_id>/batches/<int:batchid>/rerun')
+
+    Contains HTTP POST endpoint
+    Contains swagger documentation
+    """
+    @swagger.doc(batch.batchjobId_rerun_post_docs)
+    def post(self, user_id, batchid):
+        """Rerun the jobs of a batch which did not finish successfully."""
+
+        ret = self.check_permissions(user_id=user_id)
+        if ret:
+            return ret
+
+        if batchid is None:
+            return make_response("No batchid was given", 400)
+
+        log.info(("\n Received HTTP POST request to rerun batch"
+                  f" with id {str(batchid)}"))
+
+        jobs, err = rerunBatch(batchid, user_id)
+        if jobs is None:
+            res = (jsonify(SimpleResponseModel(
+                        status=err["status"],
+                        message=err["msg"]
+                   )))
+            return make_response(res, err["status"])
+
+        # start the reset jobs without open dependencies as far as the
+        # limits of parallel jobs allow
+        started_jobs = releaseJobs(g.user, batch_id=batchid)
+        if None in started_jobs:
+            res = (jsonify(SimpleResponseModel(
+                        status=500,
+                        message=('Error: There was a problem starting the '
+                                 'jobs of the batchjob again.')
+                   )))
+            return make_response(res, 500)
+        all_jobs = getJobsByBatchId(batchid, BATCH_RESPONSE_FIELDS)
+        return make_response(jsonify(createBatchResponseDict(all_jobs)), 200)
+
+
+class BatchJobsPause(ResourceManagerBase):
+    """ Definition for endpoint
+    @app.route('/resources/<string:user_id>/batches/<int:batchid>/pause')
+
+    Contains HTTP POST endpoint
+    Contains swagger documentation
+    """
+    @swagger.doc(batch.batchjobId_pause_post_docs)
+    def post(self, user_id, batchid):
+        """Pause a batch, so no further jobs of it are started."""
+
+        ret = self.check_permissions(user_id=user_id)
+        if ret:
+            return ret
+
+        if batchid is None:
+            return make_response("No batchid was given", 400)
+
+        log.info(("\n Received HTTP POST request to pause batch"
+                  f" with id {str(batchid)}"))
+
+        return _pause_batch(batchid, user_id, True)
+
+
+class BatchJobsResume(ResourceManagerBase):
+    """ Definition for endpoint
+    @app.route('/resources/<string:user_id>/batches/<int:batchid>/resume')
+
+    Contains HTTP POST endpoint
+    Contains swagger documentation
+    """
+    @swagger.doc(batch.batchjobId_resume_post_docs)
+    def post(self, user_id, batchid):
+        """Resume a paused batch."""
+
+        ret = self.check_permissions(user_id=user_id)
+        if ret:
+            return ret
+
+        if batchid is None:
+            return make_response("No batchid was given", 400)
+
+        log.info(("\n Received HTTP POST request to resume batch"
+                  f" with id {str(batchid)}"))
+
+        return _pause_batch(batchid, user_id, False)
+
+
+def _pause_batch(batchid, user_id, paused):
+    """Pause or resume a batch and create the response."""
+    batch_entry, err = pauseBatch(batchid, user_id, paused)
+    if batch_entry is None:
+        res = (jsonify(SimpleResponseModel(
+                    status=err["status"],
+                    message=err["msg"]
+               )))
+        return make_response(res, err["status"])
+
+    if paused is False:
+        # start the jobs which became ready while the batch was paused
+        started_jobs = releaseJobs(g.user, batch_id=batchid)
+        if None in started_jobs:
+            res = (jsonify(SimpleResponseModel(
+                        status=500,
+                        message=('Error: There was a problem starting the '
+                                 'jobs of the resumed batchjob.')
+                   )))
+            return make_response(res, 500)
+    all_jobs = getJobsByBatchId(batchid, BATCH_RESPONSE_FIELDS)
+    return make_response(jsonify(createBatchResponseDict(all_jobs)), 200)
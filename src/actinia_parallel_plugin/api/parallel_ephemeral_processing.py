@@ -39,11 +39,15 @@ from actinia_core.rest.base.user_auth import create_dummy_user
 
 from actinia_parallel_plugin.apidocs import batch
 from actinia_parallel_plugin.core.batches import (
+    BATCH_RESPONSE_FIELDS,
+    checkBatch,
     createBatch,
     createBatchId,
     createBatchResponseDict,
+    createBatchSummaryResponseDict,
     getJobsByBatchId,
-    startProcessingBlock,
+    releaseJobs,
+    releaseJobsInBackground,
 )
 from actinia_parallel_plugin.resources.logging import log
 
@@ -80,9 +84,6 @@ class AsyncParallelEphermeralResource(Resource):
         log.info("Received HTTP POST with batchjob: %s" %
                  str(json_dict))
 
-        # assign new batchid
-        self.batch_id = createBatchId()
-
         # Generate the base of the status URL
         host_url = request.host_url
         if host_url.endswith("/") and URL_PREFIX.startswith("/"):
@@ -95,36 +96,46 @@ class AsyncParallelEphermeralResource(Resource):
             self.base_status_url = f"{host_url}{URL_PREFIX}/resources/" \
                 f"{g.user.user_id}/"
 
-        # create processing blocks and insert jobs into jobtable
-        status_url = f"{self.base_status_url}batches/{self.batch_id}"
-        jobs_in_db = createBatch(json_dict, self.batch_id, status_url)
-        if jobs_in_db is None:
+        # check the batch before anything is inserted
+        batch_info, err = checkBatch(json_dict)
+        if batch_info is None:
             res = (jsonify(SimpleResponseModel(
-                        status=500,
-                        message=('Error: Batch Processing Chain JSON has no '
-                                 'jobs.')
+                        status=err["status"],
+                        message=err["msg"]
                    )))
-            return make_response(res, 500)
+            return make_response(res, err["status"])
 
-        # start first processing block
-        first_jobs = startProcessingBlock(
-            jobs_in_db,
-            1,
-            self.batch_id,
-            self.project_name,
-            None,  # mapset_name
-            g.user,
-            request.url,
-            self.post_url,
-            request.endpoint,
-            request.method,
-            request.path,
-            self.base_status_url,
-            "ephemeral"
-        )
-        first_status = [entry["status"] for entry in first_jobs]
-        all_jobs = getJobsByBatchId(self.batch_id)
-        if None in first_jobs:
+        # assign new batchid
+        api_info = {
+            "request_url": request.url,
+            "post_url": self.post_url,
+            "endpoint": request.endpoint,
+            "method": request.method,
+            "path": request.path,
+            "base_status_url": self.base_status_url
+        }
+        self.batch_id = createBatchId()
+
+        # insert the batch with its processing blocks and jobs into jobtable
+        status_url = f"{self.base_status_url}batches/{self.batch_id}"
+        createBatch(batch_info, self.batch_id, status_url, g.user.user_id,
+                    self.project_name, "ephemeral", api_info)
+
+        if request.args.get("async", "false").lower() == "true":
+            # the jobs are started in the background, the status can be
+            # requested from the status url
+            releaseJobsInBackground(g.user)
+            return make_response(
+                jsonify(createBatchSummaryResponseDict(self.batch_id)), 202)
+
+        # start the jobs without dependencies (first processing block) as
+        # far as the limits of parallel jobs allow, jobs of other batches
+        # which are started as well do not affect the response
+        started_jobs = releaseJobs(g.user, batch_id=self.batch_id)
+        all_jobs = getJobsByBatchId(self.batch_id, BATCH_RESPONSE_FIELDS)
+        first_status = [job["status"] for job in all_jobs
+                        if job["batch_processing_block"] == 1]
+        if None in started_jobs:
             res = (jsonify(SimpleResponseModel(
                         status=500,
                         message=('Error: There was a problem starting the '
@@ -48,11 +48,133 @@ batchjobId_get_docs = {
         "type": "string",
         "description": "a batchid",
         "required": True
+      },
+      {
+        "in": "query",
+        "name": "summary",
+        "type": "boolean",
+        "description": ("If true, only the status summary of the batchjob is "
+                        "returned without the individual jobs and their "
+                        "actinia-core responses"),
+        "required": False,
+        "default": False
       }
     ],
     "responses": {
         "200": {
             "description": ("The batchjob summary of the requested batchjob "
+                            "and all corresponding jobs (only the summary, "
+                            "status and urls if summary=true)"),
+            "schema": BatchJobResponseModel
+        },
+        "400": {
+            "description": ("A short error message in case no batchid was "
+                            "provided")
+        },
+        "404": {
+            "description": ("An error message in case the batchid was "
+                            "not found"),
+            "schema": SimpleResponseModel
+        }
+    }
+}
+
+batchjobId_delete_docs = {
+    "summary": "Cancels a batchjob.",
+    "description": ("This request will set all jobs of the requested "
+                    "batchjob which are not started yet to TERMINATED and "
+                    "request the termination of the pending and running "
+                    "jobs from actinia-core. No further jobs of the "
+                    "batchjob are started."),
+    "tags": [
+        "processing"
+    ],
+    "parameters": [
+      {
+        "in": "path",
+        "name": "batchid",
+        "type": "string",
+        "description": "a batchid",
+        "required": True
+      }
+    ],
+    "responses": {
+        "200": {
+            "description": ("The batchjob summary of the cancelled batchjob "
+                            "and all corresponding jobs"),
+            "schema": BatchJobResponseModel
+        },
+        "400": {
+            "description": ("A short error message in case no batchid was "
+                            "provided")
+        },
+        "404": {
+            "description": ("An error message in case the batchid was "
+                            "not found"),
+            "schema": SimpleResponseModel
+        }
+    }
+}
+
+batchjobId_pause_post_docs = {
+    "summary": "Pauses a batchjob.",
+    "description": ("This request will pause the requested batchjob: its "
+                    "running jobs finish, but no further jobs are started "
+                    "until the batchjob is resumed."),
+    "tags": [
+        "processing"
+    ],
+    "parameters": [
+      {
+        "in": "path",
+        "name": "batchid",
+        "type": "string",
+        "description": "a batchid",
+        "required": True
+      }
+    ],
+    "responses": {
+        "200": {
+            "description": ("The batchjob summary of the paused batchjob "
+                            "and all corresponding jobs"),
+            "schema": BatchJobResponseModel
+        },
+        "400": {
+            "description": ("A short error message in case no batchid was "
+                            "provided")
+        },
+        "404": {
+            "description": ("An error message in case the batchid was "
+                            "not found"),
+            "schema": SimpleResponseModel
+        },
+        "409": {
+            "description": ("An error message in case the batchjob was "
+                            "created by an older version"),
+            "schema": SimpleResponseModel
+        }
+    }
+}
+
+batchjobId_resume_post_docs = {
+    "summary": "Resumes a paused batchjob.",
+    "description": ("This request will resume the requested paused "
+                    "batchjob and start its jobs which are ready."),
+    "tags": [
+        "processing"
+    ],
+    "parameters": [
+      {
+        "in": "path",
+        "name": "batchid",
+        "type": "string",
+        "description": "a batchid",
+        "required": True
+      }
+    ],
+    "responses": {
+        "200": {
+            "description": ("The batchjob summary of the resumed batchjob "
                             "and all corresponding jobs"),
             "schema": BatchJobResponseModel
         },
@@ -64,6 +186,64 @@ batchjobId_get_docs = {
             "description": ("An error message in case the batchid was "
                             "not found"),
             "schema": SimpleResponseModel
+        },
+        "409": {
+            "description": ("An error message in case the batchjob was "
+                            "created by an older version"),
+            "schema": SimpleResponseModel
+        },
+        "500": {
+            "description": ("An error message in case starting the jobs "
+                            "failed"),
+            "schema": SimpleResponseModel
+        }
+    }
+}
+
+batchjobId_rerun_post_docs = {
+    "summary": "Reruns the failed jobs of a batchjob.",
+    "description": ("This request will set all jobs of the requested "
+                    "batchjob which did not finish successfully to "
+                    "PREPARING again and start them from the earliest "
+                    "incomplete processing block on. The results of the "
+                    "successful jobs are kept."),
+    "tags": [
+        "processing"
+    ],
+    "parameters": [
+      {
+        "in": "path",
+        "name": "batchid",
+        "type": "string",
+        "description": "a batchid",
+        "required": True
+      }
+    ],
+    "responses": {
+        "200": {
+            "description": ("The batchjob summary of the rerun batchjob "
+                            "and all corresponding jobs"),
+            "schema": BatchJobResponseModel
+        },
+        "400": {
+            "description": ("A short error message in case no batchid was "
+                            "provided")
+        },
+        "404": {
+            "description": ("An error message in case the batchid was "
+                            "not found"),
+            "schema": SimpleResponseModel
+        },
+        "409": {
+            "description": ("An error message in case the batchjob has "
+                            "still pending or running jobs or was created "
+                            "by an older version"),
+            "schema": SimpleResponseModel
+        },
+        "500": {
+            "description": ("An error message in case starting the jobs "
+                            "failed"),
+            "schema": SimpleResponseModel
         }
     }
 }
@@ -85,6 +265,16 @@ batchjobs_post_docs = {
         "description": "Batch Processing Chain as json object",
         "required": True,
         "schema": BatchProcessChainModel
+      },
+      {
+        "in": "query",
+        "name": "async",
+        "type": "boolean",
+        "description": ("If true, the response is sent as soon as the "
+                        "batchjob is stored and its jobs are started in the "
+                        "background"),
+        "required": False,
+        "default": False
       }
     ],
     "responses": {
@@ -93,6 +283,17 @@ batchjobs_post_docs = {
                             "all corresponding jobs"),
             "schema": BatchJobResponseModel
         },
+        "202": {
+            "description": ("The status summary and urls of the created "
+                            "batchjob in case of async=true"),
+            "schema": BatchJobResponseModel
+        },
+        "400": {
+            "description": ("An error message in case the Batch Processing "
+                            "Chain is invalid, e.g. it has no jobs or its "
+                            "job dependencies are unknown or cyclic"),
+            "schema": SimpleResponseModel
+        },
         "412": {
             "description": ("The batchjob summary of the created batchjob and "
                             "all corresponding jobs in case a job responded "
@@ -24,18 +24,85 @@ __author__ = "Guido Riembauer, Anika Weinmann"
 __copyright__ = "Copyright 2021-2022 mundialis GmbH & Co. KG"
 __maintainer__ = "mundialis GmbH % Co. KG"
 
+import pickle
+import re
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from heapq import heapify, heappop, heappush
 from json import loads
+from math import inf
+from threading import Lock, Thread
+from time import monotonic, sleep
 
-from actinia_parallel_plugin.core.jobs import insertJob
-from actinia_parallel_plugin.core.jobtable import getAllIds, getAllJobs
+from actinia_core.core.common.config import global_config
+from actinia_core.core.common.user import ActiniaUser
+from actinia_core.core.kvdb_resources import KvdbResourceInterface
+from jsonmodels.errors import ValidationError
+
+from actinia_parallel_plugin.core.job_queue import enqueueJobs
+from actinia_parallel_plugin.core.jobs import (
+    getJob,
+    shortenActiniaCoreResp,
+)
+from actinia_parallel_plugin.core.jobtable import (
+    allocateBatchId,
+    claimReadyJobs,
+    decrementBlockBarrier,
+    decrementDependentJobs,
+    getActiveJobsByBatchId,
+    getAllJobs,
+    getAverageJobDuration,
+    getBatchesByIds,
+    getDeadlineBatchProgress,
+    getStuckJobs,
+    getStatusCountsByBatchId,
+    getUrlsByBatchId,
+    hasDueRetries,
+    insertNewBatch,
+    requeueJobByID,
+    resetBatchJobs,
+    terminatePreparingJobs,
+    updateBatchByID,
+    updateJobByID,
+    updateStuckJob,
+)
 from actinia_parallel_plugin.core.parallel_processing_job import \
     AsyncParallelJobResource
+from actinia_parallel_plugin.core.parallel_resource_base import (
+    getResourceConnection,
+    getResourceLogger,
+)
 from actinia_parallel_plugin.model.batch_process_chain import (
     BatchProcessChain,
 )
+from actinia_parallel_plugin.resources.config import SCHEDULER
 from actinia_parallel_plugin.resources.logging import log
 
 
+# job fields needed to check the status of jobs and processing blocks
+JOB_STATUS_FIELDS = ["id", "status", "batch_processing_block", "resource_id"]
+# job fields needed to create the batch response, e.g. without the
+# rule_configuration
+BATCH_RESPONSE_FIELDS = [
+    "id",
+    "batch_id",
+    "batch_processing_block",
+    "status",
+    "resource_id",
+    "resource_response",
+    "creation_uuid",
+    "urls",
+]
+# options of the BPC which are stored for the whole batch
+BATCH_OPTIONS = [
+    "max_parallel", "priority", "deadline", "retry", "fail_fast"]
+
+# time of the last estimation and the slacks of the batches, see _get_slacks
+_slacks = (-inf, dict())
+_slacks_lock = Lock()
+
+
 def assignProcessingBlocks(jsonDict):
     """ Function to parse input BPC and split up the joblist according
         to the parallel parameter into processing blocks
@@ -47,7 +114,8 @@ def assignProcessingBlocks(jsonDict):
     else:
         # find out individual jobs
         jobs = [job for job in bpc_dict["jobs"]]
-        parallel_jobs = [loads(job["parallel"]) for job in jobs]
+        parallel_jobs = [
+            loads(job.get("parallel", "false")) for job in jobs]
         # a single parallel job makes no sense so this is corrected here
         parallel_jobs_corrected = []
         for idx, job in enumerate(parallel_jobs):
@@ -79,23 +147,85 @@ def assignProcessingBlocks(jsonDict):
         return result_jobs
 
 
-# def cancelBatch(batchid):
-#     """ Function to cancel all jobs that are RUNNING or PENDING
-#         by batchid
-#     """
-#     jobs = getJobsByBatchId(batchid)
-#     cancel_jobs = []
-#     id_field = JOBTABLE.id_field
-#     for job in jobs:
-#         cancel_job = cancelJob(job[id_field])
-#         cancel_jobs.append(cancel_job)
-#     if None not in cancel_jobs:
-#         # then all jobs already have a resource id etc.
-#         return cancel_jobs
-#     else:
-#         # then there are jobs that have not been posted to actinia yet,
-#         # where cancelJob returns None only
-#         return getJobsByBatchId(batchid)
+def assignDependencies(jobs):
+    """ Function to determine for each job of a BPC with explicit depends_on
+        ids the indices of the jobs it depends on. The processing block of
+        a job is set to its level in the dependency graph. Returns the
+        dependencies and an error message, which is set instead of the
+        dependencies if they are invalid or cyclic, or if the jobs also use
+        the parallel parameter, which cannot be combined with depends_on.
+    """
+    if any("parallel" in job for job in jobs):
+        return _dependency_error(
+            "The parallel parameter cannot be combined with depends_on!")
+
+    job_indices = dict()
+    for idx, job in enumerate(jobs):
+        if "id" in job:
+            if job["id"] in job_indices:
+                return _dependency_error(
+                    f"Job id {job['id']} is not unique in batch!")
+            job_indices[job["id"]] = idx
+    dependencies = []
+    for job in jobs:
+        try:
+            deps = {job_indices[dep] for dep in job.get("depends_on", [])}
+        except KeyError as e:
+            return _dependency_error(f"Job depends on unknown job id {e}!")
+        dependencies.append(sorted(deps))
+
+    # determine the level of each job by topological sorting
+    dependents = defaultdict(list)
+    for idx, deps in enumerate(dependencies):
+        for dep in deps:
+            dependents[dep].append(idx)
+    deps_remaining = [len(deps) for deps in dependencies]
+    levels = [1] * len(jobs)
+    queue = deque(idx for idx, num in enumerate(deps_remaining) if num == 0)
+    num_sorted = 0
+    while queue:
+        idx = queue.popleft()
+        num_sorted += 1
+        for dependent in dependents[idx]:
+            levels[dependent] = max(levels[dependent], levels[idx] + 1)
+            deps_remaining[dependent] -= 1
+            if deps_remaining[dependent] == 0:
+                queue.append(dependent)
+    if num_sorted < len(jobs):
+        return _dependency_error("Dependencies of the jobs contain a cycle!")
+
+    for job, level in zip(jobs, levels):
+        job["batch_processing_block"] = level
+    return dependencies, None
+
+
+def cancelBatch(batch_id, user_id):
+    """ Function to cancel all jobs of a batch which did not finish yet:
+        jobs which are not started yet are set to TERMINATED and the
+        termination of PENDING and RUNNING jobs is requested from
+        actinia-core, whose workers set them to TERMINATED. Returns the
+        cancelled jobs (db entries, only id, resource_id and status of the
+        PENDING and RUNNING jobs).
+    """
+    # first, so no further jobs of the batch are started
+    terminated_jobs = terminatePreparingJobs(batch_id)
+    active_jobs = getActiveJobsByBatchId(batch_id)
+    if len(active_jobs) > 0:
+        _commit_terminations(
+            user_id, [job["resource_id"] for job in active_jobs])
+    return terminated_jobs + active_jobs
+
+
+def failBatchFast(batch_id, user_id):
+    """ Function to cancel the other jobs of a batch with the fail_fast
+        option after one of its jobs failed. Returns the cancelled jobs
+        (db entries).
+    """
+    batch = getBatchesByIds([batch_id]).get(batch_id)
+    if batch is None or batch["fail_fast"] is not True:
+        return []
+    log.info(f"Cancelling batch {batch_id} after a job failed.")
+    return cancelBatch(batch_id, user_id)
 
 
 def checkBatchProcessChain(jsonDict):
@@ -123,31 +253,107 @@ def checkProcessingBlockFinished(jobs, block):
     return finished
 
 
-def createBatch(jsonDict, batchid, statusurl):
-    """ Function to insert all jobs from a batch into the joblist
+def countDownDependentJobs(job, failed=False):
+    """ Function to count down the open dependencies of all jobs depending
+        on a job (db entry) which finished, successfully or not: the
+        barrier of its processing block or, for batches with depends_on,
+        the jobs depending on it. Returns the jobs (db entries) which have
+        no open dependencies anymore and have to be started because enough
+        of their dependencies succeeded.
     """
-    jobs = assignProcessingBlocks(jsonDict)
+    jobs = decrementBlockBarrier(
+        job["batch_id"], job["batch_processing_block"], failed)
     if jobs is None:
-        return None
+        jobs = decrementDependentJobs(job["id"], failed)
+    return jobs
+
+
+def checkBatch(jsonDict):
+    """ Function to validate the BPC of a new batch before anything is
+        inserted and to determine the processing blocks and dependencies of
+        its jobs. Returns the batch (dict with the jobs, their dependencies
+        or the sizes of the processing blocks and the batch options) and an
+        error dict if the BPC is invalid.
+    """
+    try:
+        jobs = assignProcessingBlocks(jsonDict)
+    except (ValidationError, ValueError) as e:
+        log.error(f"Invalid Batch Processing Chain JSON: {e}")
+        return None, {
+            "status": 400,
+            "msg": f"Invalid Batch Processing Chain JSON: {e}"
+        }
+    if jobs is None:
+        return None, {
+            "status": 400,
+            "msg": "Batch Processing Chain JSON has no jobs."
+        }
+    dependencies = None
+    block_sizes = None
+    if any(job.get("depends_on") for job in jobs):
+        dependencies, error = assignDependencies(jobs)
+        if dependencies is None:
+            return None, {"status": 400, "msg": error}
     else:
-        jobs_in_db = []
-        for job in jobs:
-            job["batch_id"] = batchid
-            job["urls"] = {"status": statusurl, "resources": []}
-            # assign the model
-            job_in_db = insertJob(job)
-            jobs_in_db.append(job_in_db)
+        # the jobs wait for the previous processing block as a whole
+        block_sizes = Counter(job["batch_processing_block"] for job in jobs)
+    # the retry policy of the batch and the ones of single jobs
+    policies = [jsonDict.get("retry")] + [job.get("retry") for job in jobs]
+    for policy in policies:
+        for pattern in (policy or {}).get("errors", []):
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                log.error(f"Invalid error pattern {pattern} of retry "
+                          f"policy: {e}")
+                return None, {
+                    "status": 400,
+                    "msg": f"Invalid error pattern {pattern} of retry "
+                           f"policy: {e}"
+                }
+    for job in jobs:
+        if "min_success_ratio" not in job and \
+                "min_success_ratio" in jsonDict:
+            job["min_success_ratio"] = jsonDict["min_success_ratio"]
+    batch = {
+        "jobs": jobs,
+        "dependencies": dependencies,
+        "block_sizes": block_sizes,
+        "options": {
+            key: jsonDict[key] for key in BATCH_OPTIONS if key in jsonDict}
+    }
+    return batch, None
+
+
+def createBatch(batch, batchid, statusurl, user_id=None, project_name=None,
+                process=None, api_info=None):
+    """ Function to insert a batch checked by checkBatch with all its jobs
+        into the joblist, storing what is needed to start the jobs of the
+        batch later on
+    """
+    for job in batch["jobs"]:
+        job["batch_id"] = batchid
+        job["urls"] = {"status": statusurl, "resources": []}
+    # insert the batch and all its jobs at once
+    jobs_in_db = insertNewBatch(
+        batchid,
+        batch["jobs"],
+        batch["dependencies"],
+        batch["block_sizes"],
+        user_id=user_id,
+        project_name=project_name,
+        process=process,
+        api_info=api_info,
+        **batch["options"]
+    )
     return jobs_in_db
 
 
 def createBatchId():
-    """ Function to create a unique BatchId
+    """ Function to create a unique BatchId, the batch is inserted together
+        with its jobs by createBatch
     """
-    existing_batch_ids = getAllBatchIds()
-    if len(existing_batch_ids) == 0:
-        batch_id = 1
-    else:
-        batch_id = max(existing_batch_ids) + 1
+    batch_id = allocateBatchId()
     return batch_id
 
 
@@ -168,7 +374,7 @@ def createBatchResponseDict(jobs_list):
     jobs_status = []
     responses = {}
     job_ids = []
-    blocks = []
+    block_status_lists = defaultdict(list)
     for job in jobs:
         resource_id = job["resource_id"]
         # this way we also have "None" if no resource_id is given yet:
@@ -184,33 +390,17 @@ def createBatchResponseDict(jobs_list):
         # status.append(str(job["status"]))
         uuids.append(job["creation_uuid"])
         job_ids.append(str(job["id"]))
-        blocks.append(job["batch_processing_block"])
+        block_status_lists[job["batch_processing_block"]].append(
+            str(job["status"]))
 
     # determine an overall batch status
     overall_status_list = [job["status"] for job in jobs_status]
-    if "ERROR" in overall_status_list:
-        batch_status = "ERROR"
-    elif "TERMINATED" in overall_status_list:
-        if (("RUNNING" in overall_status_list)
-                or ("PENDING" in overall_status_list)):
-            batch_status = "TERMINATING"
-        else:
-            batch_status = "TERMINATED"
-    elif all(status == "SUCCESS" for status in overall_status_list):
-        batch_status = "SUCCESS"
-    elif all(status == "PREPARING" for status in overall_status_list):
-        batch_status = "PREPARING"
-    elif all((status == "PENDING" or status == "PREPARING") for status
-             in overall_status_list):
-        batch_status = "PENDING"
-    else:
-        batch_status = "RUNNING"
+    batch_status = _determine_batch_status(Counter(overall_status_list))
 
     # create block-wise statistics
     batch_processing_blocks = []
-    for block in sorted(set(blocks)):
-        status_list = [job["status"] for job in jobs if
-                       job["batch_processing_block"] == block]
+    for block in sorted(block_status_lists):
+        status_list = block_status_lists[block]
         status_dict = _count_status_from_list(status_list)
         if len(status_list) > 1:
             parallel = len(status_list)
@@ -249,49 +439,298 @@ def createBatchResponseDict(jobs_list):
     return responseDict
 
 
-def getAllBatchIds():
-    """ Function to return all unique batch_ids from the database
+def createBatchSummaryResponseDict(batch_id):
+    """ Function to create a status response dictionary of a batch without
+        the payloads of the jobs. The jobs are counted per processing block
+        and status in the database.
     """
-    batch_ids_raw = set(getAllIds(batch=True))
-    batch_ids = sorted([bid for bid in batch_ids_raw if bid is not None])
-    return batch_ids
+    status_counts = getStatusCountsByBatchId(batch_id)
+    if len(status_counts) == 0:
+        return {}
+
+    overall_counts = Counter()
+    block_counts = defaultdict(Counter)
+    for entry in status_counts:
+        overall_counts[entry["status"]] += entry["count"]
+        block_counts[entry["batch_processing_block"]][entry["status"]] += \
+            entry["count"]
+
+    # create block-wise statistics
+    batch_processing_blocks = []
+    for block in sorted(block_counts):
+        block_info = {
+            "block_num": block,
+            "parallel": sum(block_counts[block].values())
+        }
+        block_stats = {
+            **block_info, **_count_status_from_dict(block_counts[block])}
+        batch_processing_blocks.append(block_stats)
 
+    # create summary statistics
+    summary_dict = {
+        "total": sum(overall_counts.values()),
+        "status": _count_status_from_dict(overall_counts),
+        "blocks": batch_processing_blocks
+    }
 
-# def getAllBatches():
-#     """ Function to return all jobs that are part of a batch from the
-#     database
-#     """
-#     result_list = []
-#     batchids = getAllBatchIds()
-#     for batchid in batchids:
-#         jobs = getJobsByBatchId(batchid)
-#         jobs_response = createBatchResponseDict(jobs)
-#         result_list.append(jobs_response)
-#     result_dict = {"batch_jobs": result_list}
-#     return result_dict
+    # create overall response dict
+    responseDict = {
+        "batch_id": batch_id,
+        "summary": summary_dict,
+        "status": _determine_batch_status(overall_counts),
+        "urls": getUrlsByBatchId(batch_id),
+    }
+    return responseDict
 
 
-def getJobsByBatchId(batch_id):
-    """ Function to return all jobs (db entries) via a batch_id
+def getJobsByBatchId(batch_id, fields=None):
+    """ Function to return all jobs (db entries) via a batch_id, optionally
+        only with the given fields
     """
     filter_dict = {"batch_id": batch_id}
-    jobs = getAllJobs(filter_dict)
+    jobs = getAllJobs(filter_dict, fields)
     return jobs
 
 
-def startProcessingBlock(jobs, block, batch_id, project_name, mapset_name,
-                         user, request_url, post_url, endpoint, method, path,
-                         base_status_url, process):
-    """ Function to start a specific processing block for an input list of
-        jobs (db entries)
+def pauseBatch(batch_id, user_id, paused=True):
+    """ Function to pause a batch of the user, so no further jobs of it are
+        started while its running jobs finish, or to resume it. Returns the
+        batch (db entry) and an error dict if the batch cannot be paused.
+    """
+    batch = getBatchesByIds([batch_id]).get(batch_id)
+    # batches created by older versions have no user
+    if batch is None or batch["user_id"] not in [None, user_id]:
+        return None, {
+            "status": 404,
+            "msg": f"Batch {batch_id} does not exist for user {user_id}."
+        }
+    # only the jobs of batches with user are started by releaseJobs
+    if batch["user_id"] is None:
+        return None, {
+            "status": 409,
+            "msg": f"Batch {batch_id} was created by an older version and "
+                   "cannot be paused."
+        }
+    updateBatchByID(batch_id, paused=paused)
+    batch["paused"] = paused
+    log.info(f"Batch {batch_id} is {'paused' if paused else 'resumed'}.")
+    return batch, None
+
+
+def rerunBatch(batch_id, user_id):
+    """ Function to set all jobs of a batch of the user which did not finish
+        successfully to PREPARING again, so they are started by releaseJobs
+        from the earliest incomplete processing block on. The results of the
+        successful jobs are kept. Returns the reset jobs (db entries) and an
+        error dict if the batch cannot be rerun.
+    """
+    batch = getBatchesByIds([batch_id]).get(batch_id)
+    # batches created by older versions have no user
+    if batch is None or batch["user_id"] not in [None, user_id]:
+        return None, {
+            "status": 404,
+            "msg": f"Batch {batch_id} does not exist for user {user_id}."
+        }
+    # only the jobs of batches with user are started by releaseJobs
+    if batch["user_id"] is None:
+        return None, {
+            "status": 409,
+            "msg": f"Batch {batch_id} was created by an older version and "
+                   "cannot be rerun."
+        }
+    jobs = resetBatchJobs(batch_id)
+    if jobs is None:
+        return None, {
+            "status": 409,
+            "msg": f"Batch {batch_id} has still pending or running jobs."
+        }
+    return jobs, None
+
+
+def terminateBatch(batch_id, user_id):
+    """ Function to cancel a batch of the user, see cancelBatch. Returns
+        the cancelled jobs (db entries) and an error dict if the batch does
+        not exist.
+    """
+    batch = getBatchesByIds([batch_id]).get(batch_id)
+    # batches created by older versions have no user
+    if batch is None or batch["user_id"] not in [None, user_id]:
+        return None, {
+            "status": 404,
+            "msg": f"Batch {batch_id} does not exist for user {user_id}."
+        }
+    log.info(f"Cancelling batch {batch_id}.")
+    return cancelBatch(batch_id, user_id), None
+
+
+def retryJob(jobid, batch_id, actinia_resp, resource_id=None):
+    """ Function to set a job which ended with an error to PREPARING again
+        if the retry policy of the job or of its batch allows another
+        attempt for the error message. The job is started again after the
+        backoff. If resource_id is given, the job is only retried while
+        this is its resource id. Returns the updated job (db entry) or None
+        if the job is not retried.
     """
-    jobs_to_start = [
-        job for job in jobs if job["batch_processing_block"] == block]
+    job, _ = getJob(jobid)
+    # only jobs with dependencies are started by releaseJobs
+    if job is None or job["deps_remaining"] is None:
+        return None
+    policy = job["rule_configuration"].get("retry")
+    if policy is None:
+        policy = getBatchesByIds([batch_id])[batch_id]["retry"]
+    delay = _get_retry_delay(
+        policy, job["attempts"], str(actinia_resp.get("message")))
+    if delay is None:
+        return None
+    log.info(f"Retrying job {jobid} after attempt {job['attempts']} of "
+             f"{policy['max_attempts']} in {delay} seconds.")
+    record = requeueJobByID(
+        jobid, shortenActiniaCoreResp(actinia_resp), delay, resource_id)
+    return record
+
+
+def reapStuckJobs():
+    """ Function to recover the jobs of dead workers: RUNNING jobs without
+        heartbeat and PENDING jobs which were not enqueued or whose
+        actinia-core resource is gone. They are set to PREPARING to be
+        started again or, without attempts left, to ERROR. Returns the
+        updated jobs (db entries).
+    """
+    resource_logger = None
+    reaped_jobs = []
+    for job in getStuckJobs(SCHEDULER.heartbeat_timeout):
+        if job["status"] == "PENDING" and job["resource_id"] is not None:
+            # the job may still wait in the job queue of actinia-core
+            if job["user_id"] is None:
+                continue
+            if resource_logger is None:
+                resource_logger = getResourceLogger()
+            if resource_logger.get(
+                    job["user_id"], job["resource_id"]) is not None:
+                continue
+        # only jobs with dependencies are started by releaseJobs
+        if (job["deps_remaining"] is not None
+                and job["attempts"] < SCHEDULER.max_attempts):
+            log.warning(f"Restarting stuck job {job['id']}.")
+            record = updateStuckJob(
+                job,
+                status="PREPARING",
+                resource_id=None,
+                time_started=None,
+                time_heartbeat=None
+            )
+        else:
+            log.warning(f"Stuck job {job['id']} has no attempts left.")
+            utcnow = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+            record = updateStuckJob(
+                job,
+                status="ERROR",
+                time_ended=utcnow,
+                resource_response={
+                    "status": "error",
+                    "message": "The worker of the job stopped responding "
+                               f"after {job['attempts']} attempts."
+                }
+            )
+            if record is not None and job["deps_remaining"] is not None:
+                countDownDependentJobs(job, failed=True)
+        if record is not None:
+            reaped_jobs.append(record)
+    return reaped_jobs
+
+
+def releaseJobs(user=None, wait=True, batch_id=None):
+    """ Function to start the jobs of all batches which have no open
+        dependencies, as far as the maximal numbers of parallel jobs allow.
+        The other jobs stay PREPARING until running jobs finished. The
+        given user is used for the jobs of its own batches. If wait is
+        False, nothing is started while another process claims jobs.
+        Returns the started jobs (db entries, None for a job which could
+        not be started), if batch_id is given only the ones of this batch.
+    """
+    slacks = _get_slacks()
+    jobs = claimReadyJobs(
+        lambda active_counts, ready_jobs: _select_jobs_to_release(
+            active_counts, ready_jobs, slacks), wait, slacks)
+    batches = getBatchesByIds({job["batch_id"] for job in jobs})
+    batch_jobs = defaultdict(list)
+    for job in jobs:
+        batch_jobs[job["batch_id"]].append(job)
+
+    users = dict()
+    if user is not None:
+        users[user.get_id()] = user
     jobs_responses = []
+    for started_batch_id, jobs_to_start in batch_jobs.items():
+        batch = batches[started_batch_id]
+        if batch["user_id"] not in users:
+            users[batch["user_id"]] = _get_user(batch["user_id"])
+        if users[batch["user_id"]] is None:
+            _fail_batch(
+                started_batch_id, jobs_to_start,
+                f"The user {batch['user_id']} of batch {started_batch_id} "
+                "does not exist anymore.")
+            batch_responses = [None] * len(jobs_to_start)
+        else:
+            api_info = batch["api_info"]
+            batch_responses = startJobs(
+                jobs_to_start,
+                started_batch_id,
+                batch["project_name"],
+                None,  # mapset_name
+                users[batch["user_id"]],
+                api_info["request_url"],
+                api_info["post_url"],
+                api_info["endpoint"],
+                api_info["method"],
+                api_info["path"],
+                api_info["base_status_url"],
+                batch["process"]
+            )
+        if batch_id is None or started_batch_id == batch_id:
+            jobs_responses.extend(batch_responses)
+    return jobs_responses
+
+
+def reapJobsInBackground():
+    """ Function to recover the jobs of dead workers every
+        SCHEDULER.reap_interval seconds and to start the jobs whose retry
+        backoff ended in a background thread of the process, for
+        deployments without dispatcher. Returns the thread.
+    """
+    thread = Thread(target=_reap_jobs_periodically, daemon=True)
+    thread.start()
+    return thread
+
+
+def releaseJobsInBackground(user=None):
+    """ Function to start the ready jobs like releaseJobs, but in a
+        background thread, so the caller does not wait until all jobs are
+        enqueued. Returns the thread.
+    """
+    thread = Thread(target=_release_jobs_logged, args=(user,), daemon=True)
+    thread.start()
+    return thread
+
+
+def startJobs(jobs_to_start, batch_id, project_name, mapset_name, user,
+              request_url, post_url, endpoint, method, path, base_status_url,
+              process):
+    """ Function to start an input list of jobs (db entries) of a batch.
+        The accepted resource entries of all jobs are written to the KVDB
+        at once, the jobs are prepared concurrently by
+        SCHEDULER.start_threads threads and ephemeral jobs are enqueued in
+        the worker queues with one pipelined operation. A job which cannot
+        be started is set to ERROR without affecting the other jobs and None
+        is returned for it.
+    """
+    if len(jobs_to_start) == 0:
+        return []
     mapset_suffix = ""
     if len(jobs_to_start) > 1:
         mapset_suffix = "_parallel_"
-    for num, job in enumerate(jobs_to_start):
+
+    def prepare_job(num, job):
         process_chain = dict()
         process_chain["list"] = job["rule_configuration"]["list"]
         process_chain["version"] = job["rule_configuration"]["version"]
@@ -299,37 +738,429 @@ def startProcessingBlock(jobs, block, batch_id, project_name, mapset_name,
         mapset_name_parallel = mapset_name
         if mapset_suffix != "" and mapset_name is not None:
             mapset_name_parallel += f"{mapset_suffix}{num}"
-        parallel_job = AsyncParallelJobResource(
-            user=user,
-            request_url=request_url,
-            post_url=post_url,
-            endpoint=endpoint,
-            method=method,
-            path=path,
-            process_chain=process_chain,
-            project_name=project_name,
-            mapset_name=mapset_name_parallel,
-            batch_id=batch_id,
-            job_id=jobid,
-            base_status_url=base_status_url
-        )
-        parallel_job.start_parallel_job(process, block)
-        job_entry = parallel_job.get_job_entry()
-        jobs_responses.append(job_entry)
+        try:
+            parallel_job = AsyncParallelJobResource(
+                user=user,
+                request_url=request_url,
+                post_url=post_url,
+                endpoint=endpoint,
+                method=method,
+                path=path,
+                process_chain=process_chain,
+                project_name=project_name,
+                mapset_name=mapset_name_parallel,
+                batch_id=batch_id,
+                job_id=jobid,
+                base_status_url=base_status_url,
+                attempt=_get_attempt(job),
+                # claimed jobs have their resource id already
+                resource_id=job.get("resource_id")
+            )
+            return parallel_job, parallel_job.prepare_parallel_job()
+        except Exception as e:
+            _set_start_error(jobid, e, _get_attempt(job))
+            return None, None
+
+    def enqueue_job(job, prepared_job):
+        parallel_job, rdc = prepared_job
+        if parallel_job is None:
+            return None
+        try:
+            parallel_job.enqueue_parallel_job(
+                process, job["batch_processing_block"], rdc)
+            return parallel_job.get_job_entry(JOB_STATUS_FIELDS)
+        except Exception as e:
+            _set_start_error(job["id"], e, _get_attempt(job))
+            return None
+
+    def update_job(prepared_job):
+        parallel_job, _ = prepared_job
+        if parallel_job is None:
+            return None
+        try:
+            parallel_job.update_parallel_job()
+            return parallel_job.get_job_entry(JOB_STATUS_FIELDS)
+        except Exception as e:
+            _set_start_error(parallel_job.job_id, e, parallel_job.attempt)
+            return None
+
+    num_threads = min(SCHEDULER.start_threads, len(jobs_to_start))
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        prepared_jobs = list(executor.map(
+            prepare_job, range(len(jobs_to_start)), jobs_to_start))
+        parallel_jobs = [parallel_job for parallel_job, _ in prepared_jobs
+                         if parallel_job is not None]
+        try:
+            if len(parallel_jobs) > 0:
+                _commit_resources(parallel_jobs)
+        except Exception as e:
+            for parallel_job in parallel_jobs:
+                _set_start_error(parallel_job.job_id, e, parallel_job.attempt)
+            return [None] * len(jobs_to_start)
+        if process == "ephemeral":
+            try:
+                _enqueue_block(jobs_to_start, prepared_jobs, user,
+                               request_url, post_url, endpoint, method, path,
+                               base_status_url)
+            except Exception as e:
+                for parallel_job in parallel_jobs:
+                    _set_start_error(
+                        parallel_job.job_id, e, parallel_job.attempt)
+                return [None] * len(jobs_to_start)
+            jobs_responses = list(executor.map(
+                update_job, prepared_jobs))
+        else:
+            jobs_responses = list(executor.map(
+                enqueue_job, jobs_to_start, prepared_jobs))
     return jobs_responses
 
 
-def _count_status_from_list(input_list):
-    """ Function to count the occurence of different status strings
-        from a list
+def _enqueue_block(jobs, prepared_jobs, user, request_url, post_url,
+                   endpoint, method, path, base_status_url):
+    """ Function to enqueue the prepared jobs of a block in the worker queues
+        with one pipelined operation
+    """
+    rdcs = []
+    job_args = []
+    timeout = 0
+    for job, (parallel_job, rdc) in zip(jobs, prepared_jobs):
+        if parallel_job is None or not rdc:
+            continue
+        rdcs.append(rdc)
+        job_args.append((parallel_job.batch_id,
+                         job["batch_processing_block"], parallel_job.job_id))
+        timeout = max(timeout, parallel_job.job_timeout)
+    if len(rdcs) == 0:
+        return
+    enqueueJobs(timeout, rdcs, job_args, (
+        user, request_url, post_url, endpoint, method, path,
+        base_status_url))
+
+
+def _commit_resources(parallel_jobs, expiration=8640000):
+    """ Function to send the accepted responses of prepared jobs to the
+        resource database like ResourceLogger.commit, but with all entries
+        written in one pipeline instead of one KVDB round trip per job
+    """
+    _set_resource_entries(getResourceConnection(), [
+        (parallel_job.user_id, parallel_job.resource_id,
+         parallel_job.iteration, parallel_job.response_data)
+        for parallel_job in parallel_jobs], expiration)
+    resource_logger = getResourceLogger()
+    for parallel_job in parallel_jobs:
+        _, data = pickle.loads(parallel_job.response_data)
+        data["logger"] = "resources_logger"
+        resource_logger.send_to_logger("RESOURCE_LOG", data)
+
+
+def _commit_terminations(user_id, resource_ids, expiration=3600):
+    """ Function to request the termination of actinia-core resources like
+        ResourceLogger.commit_termination, but with all termination entries
+        written in one pipeline instead of one KVDB round trip per resource
+    """
+    _set_resource_entries(
+        getResourceConnection(),
+        [(user_id, resource_id, None, 1) for resource_id in resource_ids],
+        expiration, termination=True)
+
+
+def _set_resource_entries(connection, entries, expiration,
+                          termination=False):
+    """ Function to write entries (tuples of user id, resource id, iteration
+        and value) to the resource database in one pipeline of the
+        connection, with the keys of ResourceLogger.commit or, for
+        termination entries, of ResourceLogger.commit_termination, see
+        _get_resource_key.
+    """
+    pipeline = connection.pipeline(transaction=False)
+    for user_id, resource_id, iteration, value in entries:
+        pipeline.setex(
+            _get_resource_key(user_id, resource_id, iteration, termination),
+            expiration, value)
+    pipeline.execute()
+
+
+def _dependency_error(message):
+    """ Function to log an invalid dependency of a BPC and return it as
+        the result of assignDependencies
+    """
+    log.error(message)
+    return None, message
+
+
+def _estimate_slacks():
+    """ Function to estimate the slack of the batches with a deadline and
+        ready jobs: the seconds until the deadline minus the estimated time
+        to process the remaining processing blocks. The duration of a job is
+        estimated from the finished jobs of the batch or, if there are none
+        yet, from the recently finished jobs of all batches.
+    """
+    batches = getDeadlineBatchProgress()
+    if len(batches) == 0:
+        return dict()
+    default_duration = getAverageJobDuration() or 0
+    now = datetime.now(timezone.utc)
+    slacks = dict()
+    for batch in batches:
+        duration = batch["avg_duration"] or default_duration
+        num_blocks = batch["last_block"] - batch["first_block"] + 1
+        slacks[batch["batch_id"]] = (
+            (batch["deadline"] - now).total_seconds() - num_blocks * duration)
+    return slacks
+
+
+def _fail_batch(batch_id, jobs, message):
+    """ Function to set the claimed jobs of a batch which cannot be started
+        at all to ERROR and to terminate its waiting jobs, so they are not
+        claimed again by every release
     """
-    lower_list = [item.lower() for item in input_list]
+    log.error(message)
+    for job in jobs:
+        updateJobByID(job["id"], "error", {
+            "status": "error",
+            "message": message
+        })
+    terminatePreparingJobs(batch_id)
+
+
+def _get_slacks():
+    """ Function to get the slacks of the batches with a deadline, which are
+        estimated at most every SCHEDULER.slack_interval seconds by a
+        process, so a finished job does not aggregate the jobtable to
+        release the next jobs. The slacks of all batches age equally, so
+        their order stays valid in between.
+    """
+    global _slacks
+    with _slacks_lock:
+        time_estimated, slacks = _slacks
+        if monotonic() - time_estimated >= SCHEDULER.slack_interval:
+            slacks = _estimate_slacks()
+            _slacks = (monotonic(), slacks)
+    return slacks
+
+
+def _get_resource_key(user_id, resource_id, iteration=None,
+                      termination=False):
+    """ Function to get the key of an entry in the resource database of
+        actinia-core, which has no public function for it. The layout is
+        the one of ResourceLogger._generate_db_resource_id with the prefix
+        of KvdbResourceInterface.set or set_termination, the unit tests
+        check it against ResourceLogger of the installed actinia-core.
+    """
+    prefix = KvdbResourceInterface.resource_id_prefix
+    if termination is True:
+        prefix = KvdbResourceInterface.resource_id_termination_prefix
+    if iteration is None or iteration == 1:
+        return f"{prefix}{user_id}/{resource_id}"
+    return f"{prefix}{user_id}/{resource_id}/{iteration}"
+
+
+def _get_retry_delay(policy, attempts, message):
+    """ Function to get the seconds until a job is started again after the
+        given number of attempts failed with the error message, or None if
+        the retry policy does not allow another attempt. The job is started
+        after the backoff by the dispatcher or, without dispatcher, by the
+        background thread of the actinia processes.
+    """
+    if policy is None or attempts >= policy["max_attempts"]:
+        return None
+    patterns = policy.get("errors", [])
+    try:
+        if len(patterns) > 0 and not any(
+                re.search(pattern, message) for pattern in patterns):
+            return None
+    except re.error as e:
+        # e.g. a policy stored before the patterns were checked
+        log.error(f"Invalid error pattern of retry policy: {e}")
+        return None
+    return policy.get("backoff", 10) * policy.get(
+        "backoff_factor", 2) ** (attempts - 1)
+
+
+def _get_user(user_id):
+    """ Function to create the actinia user of a batch, which is needed to
+        start its jobs when they are released by a job of another user.
+        Returns None if the user does not exist anymore.
+    """
+    user = ActiniaUser(
+        user_id=user_id, user_group=global_config.DEFAULT_USER_GROUP)
+    if not user.exists():
+        return None
+    user.read_from_db()
+    return user
+
+
+def _reap_jobs_periodically():
+    """ Function to reap the stuck jobs in a background thread and to start
+        the reset jobs and the jobs whose retry backoff ended, which nobody
+        else would start without dispatcher
+    """
+    last_reap = monotonic()
+    last_check = datetime.utcnow()
+    while True:
+        sleep(SCHEDULER.dispatch_interval)
+        try:
+            now = datetime.utcnow()
+            release = hasDueRetries(last_check, now)
+            last_check = now
+            if monotonic() - last_reap >= SCHEDULER.reap_interval:
+                last_reap = monotonic()
+                if len(reapStuckJobs()) > 0:
+                    release = True
+            if release is True:
+                releaseJobs()
+        except Exception as e:
+            log.error(f"Could not restart the stuck or retried jobs: {e}")
+
+
+def _get_attempt(job):
+    """ Function to get the attempt of a claimed job (db entry), which may be
+        set to PREPARING again by its worker before its start is written,
+        or None for the jobs of a processing block
+    """
+    if job.get("deps_remaining") is None:
+        return None
+    return job["attempts"]
+
+
+def _release_jobs_logged(user):
+    """ Function to call releaseJobs in a background thread, where an error
+        would get lost otherwise
+    """
+    try:
+        releaseJobs(user)
+    except Exception as e:
+        log.error(f"Could not release jobs in the background: {e}")
+
+
+def _set_start_error(jobid, error, attempt=None):
+    """ Function to set a job which could not be started to ERROR, if given
+        only in the attempt which was started
+    """
+    log.error(f"Could not start job {jobid}: {error}")
+    record = updateJobByID(jobid, "error", {
+        "status": "error",
+        "message": f"Could not start the job: {error}"
+    }, attempt=attempt)
+    if record is not None and record["deps_remaining"] is not None:
+        countDownDependentJobs(record, failed=True)
+
+
+def _select_jobs_to_release(active_counts, ready_jobs, slacks=None):
+    """ Function to select the ready jobs which can be started without
+        exceeding the maximal number of parallel jobs in total, per user and
+        per batch. Jobs of batches with a higher priority are started first,
+        then jobs of batches with the least slack until their deadline. The
+        remaining free slots are shared by weighted fair queuing: the next
+        job is taken from the user with the fewest active jobs relative to
+        its share and, for this user, from the batch with the fewest active
+        jobs, so small batches do not wait behind large ones.
+    """
+    if slacks is None:
+        slacks = dict()
+    free_slots = SCHEDULER.max_parallel or inf
+    free_slots -= sum(active_counts.values())
+    user_limit = SCHEDULER.max_parallel_per_user or inf
+    user_counts = Counter()
+    batch_counts = Counter()
+    for (user_id, batch_id), num in active_counts.items():
+        user_counts[user_id] += num
+        batch_counts[batch_id] += num
+
+    # ready jobs per user and batch in the order of their ids
+    user_batches = defaultdict(lambda: defaultdict(deque))
+    batch_limits = dict()
+    batch_ranks = dict()
+    for job in ready_jobs:
+        batch_id = job["batch_id"]
+        user_batches[job["user_id"]][batch_id].append(job["id"])
+        batch_limits[batch_id] = (
+            job["max_parallel"] or SCHEDULER.max_parallel_per_batch or inf)
+        batch_ranks[batch_id] = (-job["priority"], slacks.get(batch_id, inf))
+
+    def batch_key(batch_id, jobs):
+        # the oldest ready job breaks ties between batches of the same rank
+        # and with the same number of active jobs
+        return (batch_ranks[batch_id], batch_counts[batch_id], jobs[0])
+
+    def user_entry(user_id):
+        open_batches = [
+            batch_key(batch_id, jobs)
+            for batch_id, jobs in user_batches[user_id].items()
+            if len(jobs) > 0 and batch_counts[batch_id] < batch_limits[
+                batch_id]]
+        if len(open_batches) == 0:
+            return None
+        rank, _, oldest_job = min(open_batches)
+        load = user_counts[user_id] / SCHEDULER.shares.get(user_id, 1)
+        return (rank, load, oldest_job, user_id)
+
+    queue = [user_entry(user_id) for user_id in user_batches]
+    queue = [entry for entry in queue if entry is not None]
+    heapify(queue)
+    job_ids = []
+    while len(queue) > 0 and len(job_ids) < free_slots:
+        user_id = heappop(queue)[-1]
+        if user_counts[user_id] >= user_limit:
+            continue
+        batches = user_batches[user_id]
+        batch_id = min(
+            (batch_id for batch_id, jobs in batches.items()
+             if len(jobs) > 0 and batch_counts[batch_id] < batch_limits[
+                 batch_id]),
+            key=lambda batch_id: batch_key(batch_id, batches[batch_id]))
+        job_ids.append(batches[batch_id].popleft())
+        user_counts[user_id] += 1
+        batch_counts[batch_id] += 1
+        entry = user_entry(user_id)
+        if entry is not None:
+            heappush(queue, entry)
+    return job_ids
+
+
+def _count_status_from_dict(input_dict):
+    """ Function to convert the number of jobs per status string into the
+        status counts of the response
+    """
+    lower_dict = Counter()
+    for status, num in input_dict.items():
+        lower_dict[status.lower()] += num
     res_dict = {
-        "preparing": lower_list.count("preparing"),
-        "accepted": lower_list.count("pending"),
-        "running": lower_list.count("running"),
-        "finished": lower_list.count("success"),
-        "error": lower_list.count("error"),
-        "terminated": lower_list.count("terminated")
+        "preparing": lower_dict["preparing"],
+        "accepted": lower_dict["pending"],
+        "running": lower_dict["running"],
+        "finished": lower_dict["success"],
+        "error": lower_dict["error"],
+        "terminated": lower_dict["terminated"]
     }
     return res_dict
+
+
+def _count_status_from_list(input_list):
+    """ Function to count the occurence of different status strings
+        from a list
+    """
+    return _count_status_from_dict(Counter(input_list))
+
+
+def _determine_batch_status(status_counts):
+    """ Function to determine an overall batch status from the number of
+        jobs per status
+    """
+    status_set = {status for status, num in status_counts.items() if num > 0}
+    if "ERROR" in status_set:
+        batch_status = "ERROR"
+    elif "TERMINATED" in status_set:
+        if "RUNNING" in status_set or "PENDING" in status_set:
+            batch_status = "TERMINATING"
+        else:
+            batch_status = "TERMINATED"
+    elif status_set == {"SUCCESS"}:
+        batch_status = "SUCCESS"
+    elif status_set == {"PREPARING"}:
+        batch_status = "PREPARING"
+    elif status_set <= {"PENDING", "PREPARING"}:
+        batch_status = "PENDING"
+    else:
+        batch_status = "RUNNING"
+    return batch_status
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2022 mundialis GmbH & Co. KG
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Dispatcher process which starts the ready jobs of all batches
+"""
+
+__license__ = "GPLv3"
+__author__ = "Anika Weinmann"
+__copyright__ = "Copyright 2022 mundialis GmbH & Co. KG"
+__maintainer__ = "mundialis GmbH % Co. KG"
+
+import argparse
+import os
+import sys
+from time import monotonic, sleep
+
+from actinia_core.core.common.config import global_config, DEFAULT_CONFIG_PATH
+from actinia_core.core.common.kvdb_interface import connect
+
+from actinia_parallel_plugin.core.batches import reapStuckJobs, releaseJobs
+from actinia_parallel_plugin.resources.config import SCHEDULER
+from actinia_parallel_plugin.resources.logging import log
+
+
+def dispatch():
+    """ Function to start the ready jobs once. If another dispatcher is
+        claiming jobs at the same time, nothing is started.
+    """
+    return releaseJobs(wait=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Start the ready jobs of the actinia parallel batches. "
+                    "Several dispatchers can run at the same time.")
+    parser.add_argument(
+        "--interval", type=float, default=SCHEDULER.dispatch_interval,
+        help="seconds to wait if there is no job to start")
+    parser.add_argument(
+        "--once", action="store_true",
+        help="start the ready jobs once and exit")
+    parser.add_argument(
+        "--no-reaper", action="store_true",
+        help="do not restart the jobs of dead workers")
+    args = parser.parse_args()
+
+    if os.path.isfile(DEFAULT_CONFIG_PATH):
+        global_config.read(DEFAULT_CONFIG_PATH)
+    if global_config.QUEUE_TYPE == "local":
+        log.error("The dispatcher needs a kvdb job queue, the queue type "
+                  "'local' only works inside of actinia-core.")
+        return 1
+    # the user database is needed to start the jobs of all users
+    kvdb_args = (global_config.KVDB_SERVER_URL, global_config.KVDB_SERVER_PORT)
+    if global_config.KVDB_SERVER_PW:
+        kvdb_args = (*kvdb_args, global_config.KVDB_SERVER_PW)
+    connect(*kvdb_args)
+
+    log.info("Started dispatcher.")
+    last_reap = None
+    while True:
+        if args.no_reaper is False and (
+                last_reap is None
+                or monotonic() - last_reap >= SCHEDULER.reap_interval):
+            last_reap = monotonic()
+            try:
+                reapStuckJobs()
+            except Exception as e:
+                log.error("Could not reap the stuck jobs: " + str(e))
+        try:
+            jobs = dispatch()
+        except Exception as e:
+            log.error("Could not start the ready jobs: " + str(e))
+            jobs = []
+        if args.once is True:
+            return 0
+        # claim again at once if jobs were started, there may be more
+        if len(jobs) == 0:
+            sleep(args.interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
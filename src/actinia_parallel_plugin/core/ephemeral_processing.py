@@ -26,14 +26,20 @@ __maintainer__ = "mundialis GmbH % Co. KG"
 
 
 import pickle
+from threading import Event, Thread
 
 from actinia_processing_lib.ephemeral_processing import EphemeralProcessing
 from actinia_parallel_plugin.core.batches import (
-    checkProcessingBlockFinished,
-    getJobsByBatchId,
-    startProcessingBlock,
+    countDownDependentJobs,
+    failBatchFast,
+    releaseJobs,
+    retryJob,
 )
+from actinia_parallel_plugin.core.job_queue import loadSharedParts
 from actinia_parallel_plugin.core.jobs import updateJob
+from actinia_parallel_plugin.core.jobtable import updateJobHeartbeat
+from actinia_parallel_plugin.resources.config import SCHEDULER
+from actinia_parallel_plugin.resources.logging import log
 
 
 class ParallelEphemeralProcessing(EphemeralProcessing):
@@ -55,12 +61,22 @@ class ParallelEphemeralProcessing(EphemeralProcessing):
         self.base_status_url = base_status_url
 
     def run(self):
-        super(ParallelEphemeralProcessing, self).run()
+        # write heartbeats while processing so the job is not reaped
+        stop_heartbeat = Event()
+        heartbeat = Thread(
+            target=_write_heartbeats,
+            args=(self.jobid, self.resource_id, stop_heartbeat), daemon=True)
+        heartbeat.start()
+        try:
+            super(ParallelEphemeralProcessing, self).run()
+        finally:
+            stop_heartbeat.set()
         self._update_and_check_batch_jobs()
 
     def _update_and_check_batch_jobs(self):
-        """Checks batch jobs and starts new batch block if the current block
-        is successfully finished.
+        """Checks batch jobs and starts the next jobs: the jobs depending on
+        the current job if they have no other open dependencies, or jobs
+        waiting for a free slot.
         """
 
         # update job to finished
@@ -68,40 +84,55 @@ class ParallelEphemeralProcessing(EphemeralProcessing):
         response_data = self.resource_logger.get(
             self.user_id, self.resource_id)
         _, response_model = pickle.loads(response_data)
-        updateJob(resource_id, response_model, self.jobid)
-
-        if "finished" == response_model["status"]:
-            jobs_from_batch = getJobsByBatchId(self.batch_id)
-            all_blocks = [
-                job["batch_processing_block"] for job in jobs_from_batch]
-            block = int(self.batch_processing_block)
-            block_done = checkProcessingBlockFinished(
-                jobs_from_batch, block)
-            if block_done is True and block < max(all_blocks):
-                next_block = block + 1
-                startProcessingBlock(
-                    jobs_from_batch,
-                    next_block,
-                    self.batch_id,
-                    self.project_name,
-                    None,  # mapset_name
-                    self.user,
-                    self.request_url,
-                    self.post_url,
-                    self.endpoint,
-                    self.method,
-                    self.path,
-                    self.base_status_url,
-                    "ephemeral"
-                )
-
-        elif (response_model["status"] == "error" or
-                response_model["status"] == "terminated"):
-            # In this case, nothing happens and the next block is not
-            # started.
-            pass
+
+        # the job is only updated while it has the resource id of this
+        # worker, not after it was reaped and started again
+        # failed jobs may be started again instead of setting them to ERROR
+        if response_model["status"] == "error":
+            record = retryJob(
+                self.jobid, self.batch_id, response_model, resource_id)
+            if record is not None:
+                if SCHEDULER.use_dispatcher is False:
+                    releaseJobs(self.user)
+                return
+
+        record = updateJob(
+            resource_id, response_model, self.jobid, check_resource_id=True)
+
+        # the other jobs of the batch are useless if it cannot finish
+        if record is not None and response_model["status"] == "error":
+            failBatchFast(self.batch_id, self.user_id)
+
+        # only the update which set the final status counts down the
+        # dependencies and frees the slot of the job
+        if record is not None and record["depends_on"] is not None:
+            # failed jobs are counted down as well, the dependent jobs are
+            # only started if their min_success_ratio is reached
+            countDownDependentJobs(
+                record, failed=response_model["status"] != "finished")
+            # with a dispatcher the worker only reports the status
+            if SCHEDULER.use_dispatcher is False:
+                releaseJobs(self.user)
+
+
+def _write_heartbeats(jobid, resource_id, stop_event):
+    """Writes the heartbeat of the job until stop_event is set."""
+    while not stop_event.wait(SCHEDULER.heartbeat_interval):
+        try:
+            updateJobHeartbeat(jobid, resource_id)
+        except Exception as e:
+            log.error(f"Could not write heartbeat of job {jobid}: {e}")
 
 
 def start_job(*args):
     processing = ParallelEphemeralProcessing(*args)
     processing.run()
+
+
+def start_shared_job(shared_key, rdc, *args):
+    """Starts a job enqueued by enqueueJobs, whose shared parts are read
+    from the job queue database."""
+    shared, shared_args = loadSharedParts(shared_key)
+    for name, value in shared.items():
+        setattr(rdc, name, value)
+    start_job(rdc, *args, *shared_args)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2022 mundialis GmbH & Co. KG
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Enqueue several jobs in the job queues of actinia-core at once
+"""
+
+__license__ = "GPLv3"
+__author__ = "Anika Weinmann"
+__copyright__ = "Copyright 2022 mundialis GmbH & Co. KG"
+__maintainer__ = "mundialis GmbH % Co. KG"
+
+import pickle
+from collections import defaultdict
+from copy import copy
+from threading import Lock
+
+import rq
+import valkey
+
+from actinia_core.core.common.config import global_config
+from actinia_core.core.common.kvdb_interface import enqueue_job
+
+from actinia_parallel_plugin.resources.config import SCHEDULER
+from actinia_parallel_plugin.resources.logging import log
+
+
+# parts of the ResourceDataContainer which are the same for all jobs of a
+# batch, they are stored once instead of in every job of the job queue
+SHARED_RDC_FIELDS = [
+    "config",
+    "user_credentials",
+    "api_info",
+    "grass_data_base",
+    "grass_user_data_base",
+    "grass_base_dir",
+]
+SHARED_KEY_PREFIX = "PARALLEL-SHARED::"
+
+_queue_connection = None
+_queue_connection_lock = Lock()
+
+
+def enqueueJobs(timeout, rdcs, job_args, shared_args):
+    """ Function to enqueue jobs of one batch like enqueue_job of
+        actinia-core, but with one pipelined KVDB operation for all jobs.
+        The parts of the ResourceDataContainers and the arguments which are
+        the same for all jobs are pickled and stored only once, the worker
+        reads them in start_shared_job. They are deleted when the last job
+        started and expire after KVDB_QUEUE_JOB_TTL or, if it is not set,
+        SCHEDULER.shared_parts_ttl seconds, e.g. if a job is never started.
+
+    Args:
+      timeout (int): the job timeout of the worker queue
+      rdcs (list): the ResourceDataContainer of every job
+      job_args (list): the arguments of start_job after the rdc for every
+                       job (batch_id, block, jobid)
+      shared_args (tuple): the remaining arguments of start_job, which are
+                           the same for all jobs
+    """
+    from actinia_parallel_plugin.core.ephemeral_processing import (
+        start_job,
+        start_shared_job,
+    )
+
+    if global_config.QUEUE_TYPE == "local":
+        # the local queue does not serialize the jobs
+        for rdc, args in zip(rdcs, job_args):
+            enqueue_job(timeout, start_job, rdc, *args, *shared_args)
+        return
+
+    # see enqueue_job of actinia-core
+    if timeout > 2147483647:
+        timeout = -1  # never expire
+    connection = _get_queue_connection()
+    queue_names = _get_queue_names(connection, rdcs)
+
+    shared_key = SHARED_KEY_PREFIX + rdcs[0].resource_id
+    shared = {name: getattr(rdcs[0], name) for name in SHARED_RDC_FIELDS}
+    pipeline = connection.pipeline(transaction=False)
+    # the shared parts contain the user credentials, so they are only kept
+    # while jobs may still be started
+    pipeline.hset(shared_key, mapping={
+        "data": pickle.dumps((shared, shared_args)),
+        "remaining": len(rdcs)
+    })
+    pipeline.expire(
+        shared_key,
+        global_config.KVDB_QUEUE_JOB_TTL or SCHEDULER.shared_parts_ttl)
+
+    queue_jobs = defaultdict(list)
+    for rdc, args, queue_name in zip(rdcs, job_args, queue_names):
+        job_rdc = copy(rdc)
+        for name in SHARED_RDC_FIELDS:
+            setattr(job_rdc, name, None)
+        job_rdc.set_queue_name(queue_name)
+        queue_jobs[queue_name].append(rq.Queue.prepare_data(
+            start_shared_job,
+            args=(shared_key, job_rdc, *args),
+            timeout=timeout,
+            ttl=global_config.KVDB_QUEUE_JOB_TTL,
+            result_ttl=global_config.KVDB_QUEUE_JOB_TTL
+        ))
+    for queue_name, jobs in queue_jobs.items():
+        queue = rq.Queue(queue_name, connection=connection)
+        queue.enqueue_many(jobs, pipeline=pipeline)
+    pipeline.execute()
+    log.info(f"Enqueued {len(rdcs)} jobs in {len(queue_jobs)} queues.")
+
+
+def loadSharedParts(shared_key):
+    """ Function to read the shared parts of the jobs enqueued by
+        enqueueJobs in the worker executing one of the jobs. The last job
+        of the jobs enqueued together deletes them.
+
+    Args:
+      shared_key (str): the key of the shared parts in the queue database
+
+    Returns:
+      shared (dict): the shared fields of the ResourceDataContainer
+      shared_args (tuple): the shared arguments of start_job
+    """
+    connection = rq.get_current_job().connection
+    pipeline = connection.pipeline()
+    pipeline.hget(shared_key, "data")
+    pipeline.hincrby(shared_key, "remaining", -1)
+    data, remaining = pipeline.execute()
+    if remaining <= 0:
+        connection.delete(shared_key)
+    if data is None:
+        raise RuntimeError(f"Shared parts {shared_key} of the job expired.")
+    return pickle.loads(data)
+
+
+def _get_queue_connection():
+    """ Function to get the connection to the job queue database shared by
+        the process, with a blocking pool of SCHEDULER.kvdb_pool_size
+        connections
+    """
+    global _queue_connection
+    with _queue_connection_lock:
+        if _queue_connection is None:
+            kwargs = dict()
+            kwargs["host"] = global_config.KVDB_QUEUE_SERVER_URL
+            kwargs["port"] = global_config.KVDB_QUEUE_SERVER_PORT
+            if global_config.KVDB_QUEUE_SERVER_PASSWORD:
+                kwargs["password"] = global_config.KVDB_QUEUE_SERVER_PASSWORD
+            _queue_connection = valkey.Valkey(
+                connection_pool=valkey.BlockingConnectionPool(
+                    max_connections=SCHEDULER.kvdb_pool_size, **kwargs))
+    return _queue_connection
+
+
+def _get_queue_names(connection, rdcs):
+    """ Function to choose the job queue of every job like enqueue_job of
+        actinia-core
+    """
+    prefix = global_config.WORKER_QUEUE_PREFIX
+    if global_config.QUEUE_TYPE == "per_job":
+        return [f"{prefix}_{rdc.resource_id}" for rdc in rdcs]
+    elif global_config.QUEUE_TYPE == "per_user":
+        return [f"{prefix}_{rdc.user_id}" for rdc in rdcs]
+    elif global_config.QUEUE_TYPE != "kvdb":
+        raise ValueError(
+            f"Unknown QUEUE_TYPE {global_config.QUEUE_TYPE} of actinia-core.")
+    # one counter increment for all jobs instead of one per job
+    num_queues = global_config.NUMBER_OF_WORKERS
+    last_num = connection.incrby("actinia_worker_count", len(rdcs))
+    first_num = last_num - len(rdcs) + 1
+    return [f"{prefix}_{num % num_queues}"
+            for num in range(first_num, last_num + 1)]
@@ -61,10 +61,13 @@ def shortenActiniaCoreResp(fullResp):
     return fullResp
 
 
-def updateJob(resource_id, actinia_resp, jobid):
+def updateJob(resource_id, actinia_resp, jobid, attempt=None,
+              check_resource_id=False):
     """ Method to update job in Jobtable
 
-    This method is called by webhook endpoint
+    This method is called by webhook endpoint. If an attempt is given, the
+    job is only updated while it is in this attempt. With check_resource_id
+    the job is only updated while resource_id is its resource id.
     """
 
     status = actinia_resp["status"]
@@ -74,7 +77,9 @@ def updateJob(resource_id, actinia_resp, jobid):
         jobid,
         status,
         shortenActiniaCoreResp(actinia_resp),
-        resourceId=resource_id
+        resourceId=resource_id,
+        attempt=attempt,
+        checkResourceId=check_resource_id
     )
 
     return record
@@ -25,20 +25,57 @@ __copyright__ = "Copyright 2018-2022 mundialis GmbH & Co. KG"
 __maintainer__ = "mundialis GmbH % Co. KG"
 
 
-from datetime import datetime
+from collections import Counter
+from datetime import datetime, timedelta
+from math import ceil
 
 from playhouse.shortcuts import model_to_dict
-from peewee import Expression, AutoField, OperationalError
-from time import sleep
+from peewee import (
+    Case,
+    Expression,
+    AutoField,
+    JOIN,
+    NodeList,
+    OperationalError,
+    SQL,
+    fn,
+)
 from uuid import uuid4
 from yoyo import read_migrations
 from yoyo import get_backend
 
-from actinia_parallel_plugin.model.jobtable import Job, jobdb
-from actinia_parallel_plugin.resources.config import JOBTABLE
+from actinia_parallel_plugin.model.jobtable import (
+    Batch,
+    BatchBlock,
+    Job,
+    jobdb,
+)
+from actinia_parallel_plugin.resources.config import JOBTABLE, SCHEDULER
 from actinia_parallel_plugin.resources.logging import log
 
 
+# mapping of the actinia-core status to the status in the jobtable
+ACTINIA_STATUS = {
+    'accepted': 'PENDING',
+    'running': 'RUNNING',
+    'finished': 'SUCCESS',
+    'error': 'ERROR',
+    'terminated': 'TERMINATED'
+}
+
+# allowed previous status for each status in the jobtable; PREPARING is
+# only set on creation and the final status can not be changed anymore.
+# PENDING can follow PENDING as claimed jobs are set to PENDING before
+# actinia-core accepted them
+STATUS_PREDECESSORS = {
+    'PENDING': ['PREPARING', 'PENDING'],
+    'RUNNING': ['PREPARING', 'PENDING', 'RUNNING'],
+    'SUCCESS': ['PREPARING', 'PENDING', 'RUNNING'],
+    'ERROR': ['PREPARING', 'PENDING', 'RUNNING'],
+    'TERMINATED': ['PREPARING', 'PENDING', 'RUNNING']
+}
+
+
 # We used `jobdb.connect(reuse_if_open=True)` at the beginning
 # of every method. Now we use `with jobdb:` as described in the
 # peewee docs but we still try to jobdb.close() at the end of
@@ -63,37 +100,384 @@ def applyMigrations():
     log.debug('Applied migrations.')
 
 
-def getAllIds(batch=False):
-    """ Method to read all jobs from jobtable
+def allocateBatchId():
+    """Allocate the id of a new batch from the serial of the batch table.
+
+    The id is unique even if several batches are created at the same time.
+    The batch itself is inserted together with its jobs by insertNewBatch.
+
+    Returns:
+      batch_id (int): the id of the new batch
+
+    """
+    with jobdb:
+        cursor = jobdb.execute_sql(
+            "SELECT nextval(pg_get_serial_sequence(%s, 'id'))",
+            (JOBTABLE.schema + "." + JOBTABLE.batch_table,))
+        batch_id = cursor.fetchone()[0]
+
+    jobdb.close()
+
+    return batch_id
+
+
+def insertNewBatch(batch_id, rule_configurations, dependencies=None,
+                   block_sizes=None, chunk_size=1000, **batch_kwargs):
+    """Insert a new batch into batch table and its jobs into jobtable in one
+    transaction, so there is never a batch without its jobs.
 
     Args:
-    batch (bool): indicate whether only batch jobs should be read
+      batch_id (int): the id of the batch, see allocateBatchId
+      rule_configurations (list): list of original regeldateien
+      dependencies (list): see insertNewJobs
+      block_sizes (dict): see insertNewJobs
+      chunk_size (int): maximal number of jobs per INSERT statement
+      batch_kwargs: the column values of the batch, e.g. the user_id
 
     Returns:
-    jobIds (list): the record matching the id
+      records (list): the new job records
+
     """
-    if batch is True:
-        field = JOBTABLE.batch_id_field
+    utcnow = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+    with jobdb:
+        Batch.insert(
+            id=batch_id, time_created=utcnow, **batch_kwargs).execute()
+        records = _insertJobRows(
+            rule_configurations, dependencies, block_sizes, chunk_size,
+            utcnow)
+
+    log.info("Created new batch with id " + str(batch_id) + " and "
+             + str(len(records)) + " jobs.")
+
+    jobdb.close()
+
+    return records
+
+
+def updateBatchByID(batch_id, **batch_kwargs):
+    """Update the columns of a batch in the batch table.
+
+    Args:
+      batch_id (int): the id of the batch
+      batch_kwargs: the new column values
+
+    """
+    with jobdb:
+        Batch.update(**batch_kwargs).where(Batch.id == batch_id).execute()
+
+    jobdb.close()
+
+
+def getBatchesByIds(batch_ids):
+    """Read batches from the batch table.
+
+    Args:
+      batch_ids (list): the ids of the batches
+
+    Returns:
+      batches (dict): the records of the batches by id
+
+    """
+    with jobdb:
+        queryResult = Batch.select().where(Batch.id.in_(batch_ids)).dicts()
+        batches = {record['id']: record for record in queryResult}
+
+    jobdb.close()
+
+    return batches
+
+
+def _claimReadyJobsLocked(select_jobs, slacks=None):
+    """Claim the ready jobs selected by select_jobs inside of the
+    transaction holding the claim lock, see claimReadyJobs.
+    """
+    queryResult = Job.select(
+        Batch.user_id,
+        Job.batch_id,
+        fn.COUNT(getattr(Job, JOBTABLE.id_field)).alias('count')
+    ).join(
+        Batch, on=(Job.batch_id == Batch.id)
+    ).where(
+        Batch.user_id.is_null(False)
+        & Job.status.in_(['PENDING', 'RUNNING'])
+    ).group_by(Batch.user_id, Job.batch_id).dicts()
+    active_counts = {(i['user_id'], i['batch_id']): i['count']
+                     for i in queryResult}
+
+    # no batch or user can get more jobs than are free in total, so only
+    # this many ready jobs per batch and per user are candidates
+    limit = SCHEDULER.claim_limit
+    if SCHEDULER.max_parallel > 0:
+        limit = min(
+            limit, SCHEDULER.max_parallel - sum(active_counts.values()))
+    if limit <= 0:
+        return []
+    job_id = getattr(Job, JOBTABLE.id_field)
+    # batches with less slack until their deadline are ranked first within
+    # the same priority, batches without deadline last
+    slack_columns = []
+    if slacks:
+        slack_columns.append(
+            Case(Job.batch_id, list(slacks.items())).alias('slack'))
+    batch_candidates = Job.select(
+        job_id.alias('job_id'),
+        Batch.user_id,
+        Batch.priority,
+        *slack_columns,
+        fn.ROW_NUMBER().over(
+            partition_by=[Job.batch_id], order_by=[job_id]
+        ).alias('batch_rank'),
+        fn.LEAST(limit, fn.COALESCE(
+            fn.NULLIF(Batch.max_parallel, 0),
+            SCHEDULER.max_parallel_per_batch or limit
+        )).alias('batch_limit')
+    ).join(
+        Batch, on=(Job.batch_id == Batch.id)
+    ).where(
+        Batch.user_id.is_null(False)
+        & ~Batch.paused
+        & (Job.status == 'PREPARING')
+        & (Job.deps_remaining == 0)
+        & (Job.deps_failed <= Job.deps_failures_allowed)
+        & (Job.time_next_attempt.is_null()
+           | (Job.time_next_attempt <= datetime.utcnow()))
+    ).alias('batch_candidates')
+    user_order = [batch_candidates.c.priority.desc()]
+    if slacks:
+        user_order.append(batch_candidates.c.slack.asc(nulls='LAST'))
+    user_order.append(batch_candidates.c.job_id)
+    candidates = batch_candidates.select_from(
+        batch_candidates.c.job_id,
+        fn.ROW_NUMBER().over(
+            partition_by=[batch_candidates.c.user_id],
+            order_by=user_order
+        ).alias('user_rank')
+    ).where(
+        batch_candidates.c.batch_rank <= batch_candidates.c.batch_limit
+    ).alias('candidates')
+    # only the job rows are locked, the batches can still be updated
+    ready_jobs = list(Job.select(
+        job_id,
+        Job.batch_id,
+        Batch.user_id,
+        Batch.max_parallel,
+        Batch.priority
+    ).join(
+        Batch, on=(Job.batch_id == Batch.id)
+    ).join_from(
+        Job, candidates, on=(job_id == candidates.c.job_id)
+    ).where(
+        candidates.c.user_rank <= min(
+            limit, SCHEDULER.max_parallel_per_user or limit)
+    ).order_by(job_id).for_update(
+        'FOR UPDATE', of=NodeList((Job, SQL('SKIP LOCKED')))).dicts())
+
+    job_ids = select_jobs(active_counts, ready_jobs)
+    if len(job_ids) == 0:
+        return []
+    utcnow = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    # the resource id of actinia-core is generated with the claim, so a
+    # cancelled batch can terminate the jobs which are still starting
+    return list(Job.update(
+        status='PENDING',
+        resource_id=fn.CONCAT('resource_id-', fn.gen_random_uuid()),
+        attempts=Job.attempts + 1,
+        time_heartbeat=utcnow
+    ).where(
+        getattr(Job, JOBTABLE.id_field).in_(job_ids)
+        & (Job.status == 'PREPARING')
+    ).returning(Job).dicts().execute())
+
+
+def claimReadyJobs(select_jobs, wait=True, slacks=None):
+    """Claim jobs whose dependencies are all finished.
+
+    The claiming is serialized by an advisory lock, so the numbers of
+    active jobs select_jobs gets are still valid when the selected jobs
+    are set to PENDING. Ready jobs locked by other transactions, e.g.
+    while their dependencies are counted down, are skipped with
+    SKIP LOCKED and claimed the next time. Only the job rows are locked,
+    not their batches. Per batch and per user at most as many ready jobs
+    are read as can be started, i.e. the free slots limited by
+    SCHEDULER.claim_limit, the ones of the batches with the highest
+    priority and least slack first. The claimed jobs get the resource id
+    they are started with in actinia-core.
+
+    Args:
+      select_jobs (function): gets the number of active jobs per user and
+                              batch and the ready jobs (id, batch_id and
+                              user_id, max_parallel and priority of the
+                              batch) and returns the ids of the jobs to
+                              claim
+      wait (bool): wait for the lock if another process is claiming jobs,
+                   otherwise nothing is claimed
+      slacks (dict): seconds until the deadline minus the estimated
+                     remaining processing time by batch id
+
+    Returns:
+      records (list): the claimed jobs
+
+    """
+    records = []
+    with jobdb:
+        if wait is True:
+            jobdb.execute_sql(
+                "SELECT pg_advisory_xact_lock(hashtext(%s))",
+                ("actinia-parallel-plugin.release",))
+            locked = True
+        else:
+            locked = jobdb.execute_sql(
+                "SELECT pg_try_advisory_xact_lock(hashtext(%s))",
+                ("actinia-parallel-plugin.release",)).fetchone()[0]
+        if locked is True:
+            records = _claimReadyJobsLocked(select_jobs, slacks)
+
+    jobdb.close()
+
+    if locked is False:
+        log.debug("Jobs are claimed by another process.")
     else:
-        field = JOBTABLE.id_field
+        log.debug("Claimed " + str(len(records)) + " jobs.")
+
+    return records
+
+
+def getDeadlineBatchProgress():
+    """Read the progress of the batches with a deadline and ready jobs.
+
+    Returns:
+      batches (list): dicts with batch_id, deadline, the first and last
+                      processing block with unfinished jobs and the average
+                      duration of the finished jobs in seconds
+
+    """
+    unfinished = Job.status.in_(['PREPARING', 'PENDING', 'RUNNING'])
+    ready_batches = Job.select(Job.batch_id).where(
+        (Job.status == 'PREPARING') & (Job.deps_remaining == 0)
+        & (Job.deps_failed <= Job.deps_failures_allowed))
+
     with jobdb:
-        queryResult = Job.select(getattr(Job, field)).dicts()
+        queryResult = Job.select(
+            Job.batch_id,
+            Batch.deadline,
+            fn.MIN(Job.batch_processing_block).filter(unfinished).alias(
+                'first_block'),
+            fn.MAX(Job.batch_processing_block).filter(unfinished).alias(
+                'last_block'),
+            fn.AVG(fn.date_part(
+                'epoch', Job.time_ended - Job.time_started)).filter(
+                Job.status == 'SUCCESS').alias('avg_duration')
+        ).join(
+            Batch, on=(Job.batch_id == Batch.id)
+        ).where(
+            Batch.deadline.is_null(False)
+            & Job.batch_id.in_(ready_batches)
+        ).group_by(Job.batch_id, Batch.deadline).dicts()
+        batches = list(queryResult)
 
-    jobIds = []
+    jobdb.close()
 
-    # iterating reopens db connection!!
-    for i in queryResult:
-        jobIds.append(i[field])
+    return batches
+
+
+def getAverageJobDuration(num_jobs=1000):
+    """Read the average duration of the recently finished jobs.
+
+    Args:
+      num_jobs (int): number of recently finished jobs to average
+
+    Returns:
+      duration (float): the average duration in seconds or None if no job
+                        finished yet
+
+    """
+    recent_jobs = Job.select(
+        fn.date_part('epoch', Job.time_ended - Job.time_started).alias(
+            'duration')
+    ).where(
+        (Job.status == 'SUCCESS') & Job.time_started.is_null(False)
+    ).order_by(getattr(Job, JOBTABLE.id_field).desc()).limit(num_jobs)
+
+    with jobdb:
+        duration = Job.select(fn.AVG(recent_jobs.c.duration)).from_(
+            recent_jobs).scalar()
+
+    jobdb.close()
+
+    return duration
+
+
+def decrementBlockBarrier(batch_id, block, failed=False):
+    """Count down the barrier of a processing block after one of its jobs
+    ended, successfully or not.
+
+    The counter is decremented in the database in one statement, so of
+    several jobs ending at the same time exactly one gets 0 back. This one
+    removes the barrier from all jobs of the next processing block in the
+    same transaction. So a job ending costs one UPDATE of its block counter
+    and each job of the next block is updated only once.
+
+    Args:
+      batch_id (int): the id of the batch
+      block (int): the processing block of the job
+      failed (bool): whether the job ended with an error or was terminated
+
+    Returns:
+      records (list): the jobs of the next block whose failed dependencies
+                      are tolerated if the block ended, [] if it did not end
+                      yet and None if the batch has no block barriers
+
+    """
+    updatekwargs = {'jobs_remaining': BatchBlock.jobs_remaining - 1}
+    if failed is True:
+        updatekwargs['jobs_failed'] = BatchBlock.jobs_failed + 1
+    query = BatchBlock.update(**updatekwargs).where(
+        (BatchBlock.batch_id == batch_id)
+        & (BatchBlock.batch_processing_block == block)
+    ).returning(BatchBlock.jobs_remaining, BatchBlock.jobs_failed)
+
+    with jobdb:
+        counters = list(query.tuples().execute())
+        if len(counters) == 0:
+            records = None
+        elif counters[0][0] != 0:
+            records = []
+        else:
+            records = [record for record in Job.update(
+                deps_remaining=Job.deps_remaining - 1,
+                deps_failed=counters[0][1]
+            ).where(
+                (Job.batch_id == batch_id)
+                & (Job.batch_processing_block == block + 1)
+                & (Job.deps_remaining > 0)
+            ).returning(Job).dicts().execute()
+                if record['deps_failed'] <= record['deps_failures_allowed']]
 
     jobdb.close()
 
-    return jobIds
+    return records
+
+
+def _getSelectFields(fields):
+    """ Method to get the model fields for a list of column names
+
+    Args:
+    fields (list): column names or None for all columns
+
+    Returns:
+    select_fields (list): the model fields to select
+    """
+    if fields is None:
+        return []
+    return [getattr(Job, field) for field in fields]
 
 
-def getAllJobs(filters):
+def getAllJobs(filters, fields=None):
     """ Method to read all jobs from jobtable with filter
 
     Args: filters (ImmutableMultiDict): the args from the HTTP call
+    fields (list): columns to read, all columns if None
 
     Returns:
     jobs (list): the records matching the filter
@@ -137,7 +521,8 @@ def getAllJobs(filters):
                 log.error(str(e))
 
     with jobdb:
-        queryResult = Job.select().where(query).dicts()
+        queryResult = Job.select(*_getSelectFields(fields)).where(
+            query).dicts()
 
     jobs = []
     # iterating reopens db connection!!
@@ -151,20 +536,73 @@ def getAllJobs(filters):
     return jobs
 
 
-def getJobById(jobid):
+def getStatusCountsByBatchId(batch_id):
+    """ Method to count the jobs of a batch per processing block and status
+
+    The counting is done by the database, so no job has to be loaded.
+
+    Args:
+    batch_id (int): id of the batch
+
+    Returns:
+    counts (list): dicts with batch_processing_block, status and count
+    """
+    with jobdb:
+        queryResult = Job.select(
+            Job.batch_processing_block,
+            Job.status,
+            fn.COUNT(getattr(Job, JOBTABLE.id_field)).alias('count')
+        ).where(
+            getattr(Job, JOBTABLE.batch_id_field) == batch_id
+        ).group_by(Job.batch_processing_block, Job.status).dicts()
+
+    counts = []
+    # iterating reopens db connection!!
+    for i in queryResult:
+        counts.append(i)
+
+    jobdb.close()
+
+    return counts
+
+
+def getUrlsByBatchId(batch_id):
+    """ Method to read the urls of a batch from jobtable
+
+    Args:
+    batch_id (int): id of the batch
+
+    Returns:
+    urls (dict): the urls of the batch or None if the batch does not exist
+    """
+    try:
+        with jobdb:
+            queryResult = Job.select(Job.urls).where(
+                getattr(Job, JOBTABLE.batch_id_field) == batch_id
+            ).limit(1).get()
+        urls = queryResult.urls
+    except Job.DoesNotExist:
+        urls = None
+
+    jobdb.close()
+
+    return urls
+
+
+def getJobById(jobid, fields=None):
     """ Method to read job from jobtable by id
 
     Args:
     jobid (int): id of job
+    fields (list): columns to read, all columns if None
 
     Returns:
     record (dict): the record matching the id
     """
     try:
         with jobdb:
-            queryResult = Job.select().where(
-                getattr(Job, JOBTABLE.id_field) == jobid).get()
-        record = model_to_dict(queryResult)
+            record = Job.select(*_getSelectFields(fields)).where(
+                getattr(Job, JOBTABLE.id_field) == jobid).dicts().get()
         err = None
     except Job.DoesNotExist:
         record = None
@@ -196,28 +634,34 @@ def getJobById(jobid):
     return record, err
 
 
-def getJobByResource(key, val):
-    """ Method to read job from jobtable by resource
+def _createJobKwargs(rule_configuration, utcnow):
+    """Create the column values of a new job for the jobtable.
 
     Args:
-    key (string): key of attribute
-    val (string): value of attribute
+      rule_configuration (dict): original regeldatei
+      utcnow (str): creation timestamp
 
     Returns:
-    record (dict): the record matching the id
-    """
-    try:
-        with jobdb:
-            queryResult = Job.select().where(
-                getattr(Job, key) == val).get()
-        record = model_to_dict(queryResult)
+      job_kwargs (dict): the column values of the new job
 
-    except Job.DoesNotExist:
-        record = None
-
-    jobdb.close()
-
-    return record
+    """
+    job_kwargs = {
+        'rule_configuration': rule_configuration,
+        'status': 'PREPARING',
+        'time_created': utcnow,
+        'creation_uuid': uuid4(),
+        'batch_processing_block': None,
+        'batch_id': None,
+        'urls': None
+    }
+    if "batch_id" in rule_configuration.keys():
+        # then it's a batch job
+        job_kwargs["batch_processing_block"] = rule_configuration[
+            "batch_processing_block"]
+        job_kwargs["batch_id"] = rule_configuration["batch_id"]
+    if "urls" in rule_configuration.keys():
+        job_kwargs["urls"] = rule_configuration["urls"]
+    return job_kwargs
 
 
 def insertNewJob(
@@ -234,21 +678,7 @@ def insertNewJob(
     """
     utcnow = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
 
-    creation_uuid = uuid4()
-
-    job_kwargs = {
-        'rule_configuration': rule_configuration,
-        'status': 'PREPARING',
-        'time_created': utcnow,
-        'creation_uuid': creation_uuid
-    }
-    if "batch_id" in rule_configuration.keys():
-        # then it's a batch job
-        job_kwargs["batch_processing_block"] = rule_configuration[
-            "batch_processing_block"]
-        job_kwargs["batch_id"] = rule_configuration["batch_id"]
-    if "urls" in rule_configuration.keys():
-        job_kwargs["urls"] = rule_configuration["urls"]
+    job_kwargs = _createJobKwargs(rule_configuration, utcnow)
     job = Job(**job_kwargs)
 
     with jobdb:
@@ -257,7 +687,7 @@ def insertNewJob(
     # so make each connection duration as short as possible
     with jobdb:
         queryResult = Job.select().where((Job.time_created == utcnow) & (
-            Job.creation_uuid == creation_uuid)).get()
+            Job.creation_uuid == job_kwargs['creation_uuid'])).get()
 
     record = model_to_dict(queryResult)
 
@@ -268,100 +698,530 @@ def insertNewJob(
     return record
 
 
-def updateJobByID(jobid, status, resp, resourceId=None):
+def _allocateJobIds(num):
+    """Allocate ids for new jobs from the serial of the jobtable.
+
+    Args:
+      num (int): number of ids
+
+    Returns:
+      job_ids (list): the allocated ids
+
+    """
+    cursor = jobdb.execute_sql(
+        "SELECT nextval(pg_get_serial_sequence(%s, %s)) "
+        "FROM generate_series(1, %s)",
+        (JOBTABLE.schema + "." + JOBTABLE.table, JOBTABLE.id_field, num))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _getDepsFailuresAllowed(num_deps, ratio):
+    """Compute how many dependencies of a job may fail.
+
+    Args:
+      num_deps (int): number of dependencies of the job
+      ratio (float): min_success_ratio of the job or None if all
+                     dependencies have to succeed
+
+    Returns:
+      deps_failures_allowed (int): number of dependencies which may fail
+
+    """
+    if ratio is None:
+        return 0
+    # rounded against float errors like 0.07 * 100
+    return num_deps - ceil(round(ratio * num_deps, 6))
+
+
+def insertNewJobs(rule_configurations, dependencies=None, block_sizes=None,
+                  chunk_size=1000):
+    """Insert several new jobs into jobtable in one transaction.
+
+    The jobs are written with multi-row INSERT ... RETURNING statements of
+    at most chunk_size rows, so the number of database round trips does not
+    grow with every single job.
+
+    If dependencies are given, the ids of the jobs are allocated before the
+    INSERT, so the dependencies can be stored as job ids. If block_sizes
+    are given instead, every job waits for the previous processing block
+    as a whole: its block counter is inserted as well and the job has one
+    open dependency, the barrier of the previous block. The
+    min_success_ratio of a job determines how many of its dependencies
+    may fail.
+
+    Args:
+      rule_configurations (list): list of original regeldateien
+      dependencies (list): for every job the indices of the jobs in
+                           rule_configurations it depends on
+      block_sizes (dict): number of jobs per processing block of the batch
+      chunk_size (int): maximal number of jobs per INSERT statement
+
+    Returns:
+      records (list): the new records
+
+    """
+    utcnow = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+    # `with jobdb` wraps all chunks into one transaction
+    with jobdb:
+        records = _insertJobRows(
+            rule_configurations, dependencies, block_sizes, chunk_size,
+            utcnow)
+
+    log.info("Created " + str(len(records)) + " new jobs.")
+
+    jobdb.close()
+
+    return records
+
+
+def _insertJobRows(rule_configurations, dependencies, block_sizes,
+                   chunk_size, utcnow):
+    """Insert new jobs into jobtable inside an open transaction, see
+    insertNewJobs.
+
+    Returns:
+      records (list): the new records
+
+    """
+    rows = [_createJobKwargs(rule_configuration, utcnow)
+            for rule_configuration in rule_configurations]
+
+    records = []
+    if dependencies is not None:
+        job_ids = _allocateJobIds(len(rows))
+        for row, job_id, deps in zip(rows, job_ids, dependencies):
+            row[JOBTABLE.id_field] = job_id
+            row['depends_on'] = [job_ids[dep] for dep in deps]
+            row['deps_remaining'] = len(deps)
+            row['deps_failures_allowed'] = _getDepsFailuresAllowed(
+                len(deps),
+                row['rule_configuration'].get('min_success_ratio'))
+    elif block_sizes is not None:
+        for row in rows:
+            num_deps = block_sizes.get(
+                row['batch_processing_block'] - 1, 0)
+            row['depends_on'] = []
+            row['deps_remaining'] = 1 if num_deps > 0 else 0
+            row['deps_failures_allowed'] = _getDepsFailuresAllowed(
+                num_deps,
+                row['rule_configuration'].get('min_success_ratio'))
+        BatchBlock.insert_many([
+            {
+                'batch_id': rows[0]['batch_id'],
+                'batch_processing_block': block,
+                'jobs_total': num_jobs,
+                'jobs_remaining': num_jobs
+            } for block, num_jobs in block_sizes.items()]).execute()
+    for idx in range(0, len(rows), chunk_size):
+        query = Job.insert_many(rows[idx:idx + chunk_size]).returning(
+            Job).dicts()
+        records.extend(query.execute())
+
+    return records
+
+
+def requeueJobByID(jobid, resp, delay=0, resourceId=None):
+    """Set a failed job to PREPARING, so it is started again.
+
+    Args:
+      jobid (int): the id of the job
+      resp (dict): actinia-core response of the failed attempt
+      delay (float): seconds until the job may be started again
+      resourceId (str): if given, the job is only requeued while this is
+                        its resource id, so the worker of an earlier attempt
+                        cannot requeue a job which was started again
+
+    Returns:
+      record (dict): the updated record or None if the job does not exist,
+                     has already a final status or another resource id
+
+    """
+    time_next_attempt = datetime.utcnow() + timedelta(seconds=delay)
+    query = Job.update(
+        status='PREPARING',
+        resource_response=resp,
+        resource_id=None,
+        time_started=None,
+        time_heartbeat=None,
+        time_next_attempt=time_next_attempt
+    )
+    where = ((getattr(Job, JOBTABLE.id_field) == jobid)
+             & Job.status.in_(['PENDING', 'RUNNING']))
+    if resourceId is not None:
+        where &= (Job.resource_id == resourceId)
+    query = query.where(where).returning(Job).dicts()
+
+    with jobdb:
+        records = list(query.execute())
+
+    jobdb.close()
+
+    if len(records) == 0:
+        return None
+
+    log.info("Requeued job with id " + str(jobid) + ".")
+
+    return records[0]
+
+
+def hasDueRetries(since, until):
+    """Check if the backoff of a requeued job ended in a time span.
+
+    Args:
+      since (datetime): begin of the time span (exclusive, UTC)
+      until (datetime): end of the time span (inclusive, UTC)
+
+    Returns:
+      due (bool): True if a PREPARING job may be started again since the
+                  end of its backoff in the time span
+
+    """
+    query = Job.select(getattr(Job, JOBTABLE.id_field)).where(
+        (Job.status == 'PREPARING')
+        & (Job.time_next_attempt > since)
+        & (Job.time_next_attempt <= until)
+    )
+
+    with jobdb:
+        due = query.exists()
+
+    jobdb.close()
+
+    return due
+
+
+def updateJobHeartbeat(jobid, resourceId=None):
+    """Write the heartbeat of a job which is processed by a worker.
+
+    Args:
+      jobid (int): the id of the job
+      resourceId (str): if given, the heartbeat is only written while this
+                        is the resource id of the job
+
+    """
+    utcnow = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+    where = ((getattr(Job, JOBTABLE.id_field) == jobid)
+             & Job.status.in_(['PENDING', 'RUNNING']))
+    if resourceId is not None:
+        where &= (Job.resource_id == resourceId)
+
+    with jobdb:
+        Job.update(time_heartbeat=utcnow).where(where).execute()
+
+    jobdb.close()
+
+
+def getStuckJobs(timeout):
+    """Read the PENDING and RUNNING jobs without heartbeat.
+
+    Args:
+      timeout (float): seconds since the last heartbeat, or the start if
+                       there is none
+
+    Returns:
+      records (list): the jobs with id, status, resource_id, time_heartbeat,
+                      attempts, batch_id, batch_processing_block,
+                      deps_remaining and the user_id of the batch
+
+    """
+    threshold = datetime.utcnow() - timedelta(seconds=timeout)
+    last_sign = fn.COALESCE(Job.time_heartbeat, Job.time_started,
+                            Job.time_created)
+
+    with jobdb:
+        queryResult = Job.select(
+            getattr(Job, JOBTABLE.id_field),
+            Job.status,
+            Job.resource_id,
+            Job.time_heartbeat,
+            Job.attempts,
+            Job.batch_id,
+            Job.batch_processing_block,
+            Job.deps_remaining,
+            Batch.user_id
+        ).join(
+            Batch, JOIN.LEFT_OUTER, on=(Job.batch_id == Batch.id)
+        ).where(
+            Job.status.in_(['PENDING', 'RUNNING'])
+            & (last_sign < threshold)
+        ).dicts()
+        records = list(queryResult)
+
+    jobdb.close()
+
+    return records
+
+
+def updateStuckJob(job, **updatekwargs):
+    """Update a job found by getStuckJobs if it is still stuck.
+
+    The update is only done if the status and the heartbeat of the job did
+    not change in the meantime.
+
+    Args:
+      job (dict): the job from getStuckJobs
+      updatekwargs: the new column values
+
+    Returns:
+      record (dict): the updated record or None if the job changed
+
+    """
+    if job['time_heartbeat'] is None:
+        heartbeat = Job.time_heartbeat.is_null()
+    else:
+        heartbeat = (Job.time_heartbeat == job['time_heartbeat'])
+    query = Job.update(**updatekwargs).where(
+        (getattr(Job, JOBTABLE.id_field) == job[JOBTABLE.id_field])
+        & (Job.status == job['status'])
+        & heartbeat
+    ).returning(Job).dicts()
+
+    with jobdb:
+        records = list(query.execute())
+
+    jobdb.close()
+
+    if len(records) == 0:
+        return None
+    return records[0]
+
+
+def decrementDependentJobs(jobid, failed=False):
+    """Decrement the open dependencies of all jobs depending on a job.
+
+    The counters are decremented in the database in one statement, so of
+    several jobs finishing at the same time exactly one gets 0 back for a
+    common dependent job.
+
+    Args:
+      jobid (int): the id of the finished job
+      failed (bool): whether the job ended with an error or was terminated
+
+    Returns:
+      records (list): the dependent jobs without open dependencies whose
+                      failed dependencies are tolerated
+
+    """
+    updatekwargs = {'deps_remaining': Job.deps_remaining - 1}
+    if failed is True:
+        updatekwargs['deps_failed'] = Job.deps_failed + 1
+    query = Job.update(**updatekwargs).where(
+        Job.depends_on.contains([jobid])
+    ).returning(Job).dicts()
+
+    with jobdb:
+        records = [record for record in query.execute()
+                   if record['deps_remaining'] == 0
+                   and record['deps_failed'] <= record[
+                       'deps_failures_allowed']]
+
+    jobdb.close()
+
+    return records
+
+
+def terminatePreparingJobs(batch_id):
+    """Set all jobs of a batch which are not started yet to TERMINATED.
+
+    Args:
+      batch_id (int): the id of the batch
+
+    Returns:
+      records (list): the terminated jobs
+
+    """
+    utcnow = datetime.utcnow()
+    query = Job.update(
+        status='TERMINATED',
+        time_ended=utcnow
+    ).where(
+        (Job.batch_id == batch_id) & (Job.status == 'PREPARING')
+    ).returning(Job).dicts()
+
+    with jobdb:
+        records = list(query.execute())
+
+    jobdb.close()
+
+    log.info(f"Terminated {len(records)} waiting jobs of batch {batch_id}.")
+
+    return records
+
+
+def getActiveJobsByBatchId(batch_id):
+    """Read the jobs of a batch which are enqueued in or running in
+    actinia-core.
+
+    Args:
+      batch_id (int): the id of the batch
+
+    Returns:
+      records (list): the id, resource_id and status of the PENDING and
+                      RUNNING jobs with a resource id
+
+    """
+    with jobdb:
+        records = list(Job.select(
+            getattr(Job, JOBTABLE.id_field),
+            Job.resource_id,
+            Job.status
+        ).where(
+            (Job.batch_id == batch_id)
+            & Job.status.in_(['PENDING', 'RUNNING'])
+            & Job.resource_id.is_null(False)
+        ).dicts())
+
+    jobdb.close()
+
+    return records
+
+
+def resetBatchJobs(batch_id):
+    """Set all jobs of a batch which did not finish successfully to
+    PREPARING again, so they are started again.
+
+    The open dependencies of the jobs are counted again, so only the jobs
+    whose dependencies all succeeded are started at once. For batches with
+    block barriers, the block counters are reset to the unfinished jobs and
+    the jobs wait for their previous block if it has unfinished jobs.
+    Nothing is reset if a job of the batch is still PENDING or RUNNING.
+
+    Args:
+      batch_id (int): the id of the batch
+
+    Returns:
+      records (list): the reset jobs or None if the batch has active jobs
+
+    """
+    with jobdb:
+        jobs = list(Job.select(
+            getattr(Job, JOBTABLE.id_field), Job.status, Job.depends_on,
+            Job.batch_processing_block
+        ).where(Job.batch_id == batch_id).for_update().dicts())
+        blocks = list(BatchBlock.select(
+            BatchBlock.batch_processing_block
+        ).where(BatchBlock.batch_id == batch_id).for_update().tuples())
+        if any(job['status'] in ['PENDING', 'RUNNING'] for job in jobs):
+            records = None
+        else:
+            succeeded = {job[JOBTABLE.id_field] for job in jobs
+                         if job['status'] == 'SUCCESS'}
+            unfinished = Counter(
+                job['batch_processing_block'] for job in jobs
+                if job['status'] != 'SUCCESS')
+            jobs_by_deps = dict()
+            for job in jobs:
+                if job['status'] == 'SUCCESS':
+                    continue
+                if len(blocks) > 0:
+                    deps_remaining = 1 if unfinished[
+                        job['batch_processing_block'] - 1] > 0 else 0
+                else:
+                    deps_remaining = len(
+                        [dep for dep in job['depends_on'] or []
+                         if dep not in succeeded])
+                jobs_by_deps.setdefault(deps_remaining, []).append(
+                    job[JOBTABLE.id_field])
+            for (block,) in blocks:
+                BatchBlock.update(
+                    jobs_remaining=unfinished[block],
+                    jobs_failed=0
+                ).where(
+                    (BatchBlock.batch_id == batch_id)
+                    & (BatchBlock.batch_processing_block == block)
+                ).execute()
+            records = []
+            for deps_remaining, job_ids in jobs_by_deps.items():
+                query = Job.update(
+                    status='PREPARING',
+                    resource_id=None,
+                    resource_response=None,
+                    time_started=None,
+                    time_ended=None,
+                    time_heartbeat=None,
+                    time_next_attempt=None,
+                    attempts=0,
+                    deps_remaining=deps_remaining,
+                    deps_failed=0
+                ).where(
+                    getattr(Job, JOBTABLE.id_field).in_(job_ids)
+                ).returning(Job).dicts()
+                records.extend(query.execute())
+
+    jobdb.close()
+
+    if records is not None:
+        log.info(f"Reset {len(records)} jobs of batch {batch_id}.")
+
+    return records
+
+
+def updateJobByID(jobid, status, resp, resourceId=None, attempt=None,
+                  checkResourceId=False):
     """ Method to update job in jobtable when processing status changed
 
+    The status transition is checked and written in one conditional
+    UPDATE ... RETURNING statement, so a job can never go back to a
+    previous status, e.g. if the final status of a worker arrives before
+    the "accepted" status of the job start.
+
     Args:
     jobid (int): the id of the job
     status (string): actinia-core processing status
     resp (dict): actinia-core response
     resourceId (str): actinia-core resourceId
+    attempt (int): if given, the job is only updated in this attempt and
+                   not after it was set to PREPARING to be started again
+    checkResourceId (bool): if True, the job is only updated while
+                            resourceId is its resource id, so the worker of
+                            an earlier attempt cannot overwrite a job which
+                            was started again
 
     Returns:
-    updatedRecord (TODO): the updated record
+    updatedRecord (dict): the updated record or None if the job does not
+                          exist or the status transition is not allowed
     """
 
-    if status == 'accepted':
-        status = 'PENDING'
-    elif status == 'running':
-        status = 'RUNNING'
-    elif status == 'finished':
-        status = 'SUCCESS'
-    elif status == 'error':
-        status = 'ERROR'
-    elif status == 'terminated':
-        status = 'TERMINATED'
+    status = ACTINIA_STATUS.get(status, status)
+    if status not in STATUS_PREDECESSORS:
+        log.error('Could not set the status to actinia-core status: '
+                  + status + '(Status not found.)')
+        return None
 
     utcnow = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
-    record = None
-    while record is None:
-        record, err = getJobById(jobid)
-        sleep(1)
-    dbStatus = record['status']
 
-    try:
-        if status == 'PENDING':
-            if dbStatus == status:
-                return record
-            log.debug("Update status to " + status + " for job with id "
-                      + str(record['id']) + ".")
-            updatekwargs = {
-                'status': status,
-                'resource_response': resp,
-                'resource_id': resourceId
-            }
-
-            query = Job.update(**updatekwargs).where(
-                getattr(Job, JOBTABLE.id_field) == jobid
-            )
-
-        elif status == 'RUNNING':
-            updatekwargs = dict()
-
-            if dbStatus == status:
-                updatekwargs['resource_response'] = resp
-
-            else:
-                log.debug("Update status to " + status + " for job with id "
-                          + str(record['id']) + ".")
-                updatekwargs['status'] = status
-                updatekwargs['resource_response'] = resp
-                updatekwargs['time_started'] = utcnow
-                if resourceId is not None:
-                    updatekwargs['resource_id'] = resourceId
-                # TODO: check if time_estimated can be set
-                # time_estimated=
-
-            query = Job.update(**updatekwargs).where(
-                getattr(Job, JOBTABLE.id_field) == jobid
-            )
-
-        elif status in ['SUCCESS', 'ERROR', 'TERMINATED']:
-            log.debug("Update status to " + status + " for job with id "
-                      + str(record['id']) + ".")
-            updatekwargs = {
-                'status': status,
-                'resource_response': resp,
-                'time_ended': utcnow
-            }
-            if resourceId is not None:
-                updatekwargs['resource_id'] = resourceId
-
-            query = Job.update(**updatekwargs).where(
-                getattr(Job, JOBTABLE.id_field) == jobid
-            )
+    updatekwargs = {
+        'status': status,
+        'resource_response': resp
+    }
+    if status == 'PENDING':
+        updatekwargs['resource_id'] = resourceId
+    elif status == 'RUNNING':
+        # only the first RUNNING update sets the start time
+        updatekwargs['time_started'] = fn.COALESCE(Job.time_started, utcnow)
+        if resourceId is not None:
+            updatekwargs['resource_id'] = resourceId
+        # TODO: check if time_estimated can be set
+        # time_estimated=
+    else:
+        updatekwargs['time_ended'] = utcnow
+        if resourceId is not None:
+            updatekwargs['resource_id'] = resourceId
 
-        else:
-            log.error('Could not set the status to actinia-core status: '
-                      + status + '(Status not found.)')
-            return None
+    where = ((getattr(Job, JOBTABLE.id_field) == jobid)
+             & (Job.status.in_(STATUS_PREDECESSORS[status])))
+    if attempt is not None:
+        where &= (Job.attempts == attempt) & (Job.status != 'PREPARING')
+    if checkResourceId is True:
+        where &= (Job.resource_id == resourceId)
 
-        with jobdb:
-            query.execute()
-            queryResult = Job.select().where(
-                getattr(Job, JOBTABLE.id_field) == jobid).get()
+    query = Job.update(**updatekwargs).where(where).returning(Job).dicts()
 
-        record = model_to_dict(queryResult)
+    try:
+        with jobdb:
+            records = list(query.execute())
     except Exception as e:
         log.error('Could not set the status to actinia-core status: ' + status)
         log.error(str(e))
@@ -369,4 +1229,12 @@ def updateJobByID(jobid, status, resp, resourceId=None):
 
     jobdb.close()
 
-    return record
+    if len(records) == 0:
+        log.debug("Status of job with id " + str(jobid) + " not updated to "
+                  + status + " (job does not exist or has a later status).")
+        return None
+
+    log.debug("Update status to " + status + " for job with id "
+              + str(jobid) + ".")
+
+    return records[0]
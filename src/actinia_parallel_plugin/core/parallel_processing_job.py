@@ -40,7 +40,8 @@ class AsyncParallelJobResource(ParallelResourceBase):
 
     def __init__(self, user, request_url, post_url, endpoint, method, path,
                  process_chain, project_name, mapset_name,
-                 batch_id, job_id, base_status_url):
+                 batch_id, job_id, base_status_url, attempt=None,
+                 resource_id=None):
         super(AsyncParallelJobResource, self).__init__(
             user=user,
             request_url=request_url,
@@ -48,12 +49,16 @@ class AsyncParallelJobResource(ParallelResourceBase):
             method=method,
             path=path,
             post_url=post_url,
-            base_status_url=base_status_url
+            base_status_url=base_status_url,
+            resource_id=resource_id
         )
         self.project_name = project_name
         self.mapset_name = mapset_name
         self.batch_id = batch_id
         self.job_id = job_id
+        # attempt of a claimed job, which may be requeued by its worker
+        # before the start is written
+        self.attempt = attempt
         self.request_data = process_chain
         self.post_url = post_url
         self.endpoint = endpoint
@@ -63,7 +68,6 @@ class AsyncParallelJobResource(ParallelResourceBase):
 
     def start_parallel_job(self, process, block):
         """Starting job in running actinia-core instance and update job db."""
-        job, err = getJobById(self.job_id)
         # TODO prepare_actinia ?
         # TODO execute_actinia ?
         # TODO goodby_actinia ?
@@ -73,6 +77,22 @@ class AsyncParallelJobResource(ParallelResourceBase):
             project_name=self.project_name,
             mapset_name=self.mapset_name
         )
+        return self.enqueue_parallel_job(process, block, rdc)
+
+    def prepare_parallel_job(self):
+        """Create the accepted response of the job without sending it to the
+        resource database, so the responses of several jobs can be sent
+        together."""
+        return self.preprocess(
+            has_json=False,
+            project_name=self.project_name,
+            mapset_name=self.mapset_name,
+            commit=False
+        )
+
+    def enqueue_parallel_job(self, process, block, rdc):
+        """Enqueue the preprocessed job in running actinia-core instance and
+        update job db."""
         if rdc:
             if process == "ephemeral":
                 from actinia_parallel_plugin.core.ephemeral_processing import \
@@ -120,7 +140,8 @@ class AsyncParallelJobResource(ParallelResourceBase):
                 _, response_model = pickle.loads(self.response_data)
                 response_model["status"] = "error"
                 response_model["message"] = msg
-                job = updateJob(self.resource_id, response_model, self.job_id)
+                job = updateJob(self.resource_id, response_model,
+                                self.job_id, self.attempt)
                 return job
             enqueue_job(
                 self.job_timeout,
@@ -138,13 +159,19 @@ class AsyncParallelJobResource(ParallelResourceBase):
                 self.base_status_url
             )
 
-        # update job in jobtable
-        self.response_data = self.resource_logger.get(
-            self.user_id, self.resource_id, self.iteration)
+        return self.update_parallel_job()
+
+    def update_parallel_job(self):
+        """Update job db after the job was enqueued."""
+        # update job in jobtable with the accepted response instead of reading
+        # it back from the resource database; if the worker was faster, the
+        # later status is kept
         _, response_model = pickle.loads(self.response_data)
-        job = updateJob(self.resource_id, response_model, self.job_id)
+        job = updateJob(self.resource_id, response_model, self.job_id,
+                        self.attempt)
         return job
 
-    def get_job_entry(self):
-        """Return job entry by requesting jobtable from db."""
-        return getJobById(self.job_id)[0]
+    def get_job_entry(self, fields=None):
+        """Return job entry by requesting jobtable from db, optionally only
+        with the given fields."""
+        return getJobById(self.job_id, fields)[0]
@@ -27,7 +27,9 @@ __maintainer__ = "mundialis GmbH % Co. KG"
 import time
 import os
 from datetime import datetime
+from threading import Lock
 
+import valkey
 from flask_restful_swagger_2 import Resource
 
 from actinia_core.core.common.config import global_config
@@ -41,6 +43,68 @@ from actinia_core.models.response_models import (
 )
 from actinia_core.core.resource_data_container import ResourceDataContainer
 
+from actinia_parallel_plugin.resources.config import SCHEDULER
+
+
+# loggers and connection shared by all parallel job resources of the process
+_resource_logger = None
+_resource_connection = None
+_message_logger = None
+_logger_lock = Lock()
+
+
+def getResourceConnection():
+    """Return the connection to the resource database shared by the process
+    for writing the entries of many jobs at once. It has its own blocking
+    pool of SCHEDULER.kvdb_pool_size connections, so threads wait for a
+    free connection, and leaves the connections of actinia-core untouched.
+    The KVDB is pinged once after the pool is created, so a wrong
+    configuration raises here and the next call tries again.
+    """
+    global _resource_connection
+    with _logger_lock:
+        if _resource_connection is None:
+            kwargs = dict()
+            kwargs['host'] = global_config.KVDB_SERVER_URL
+            kwargs['port'] = global_config.KVDB_SERVER_PORT
+            if (global_config.KVDB_SERVER_PW and
+                    global_config.KVDB_SERVER_PW is not None):
+                kwargs['password'] = global_config.KVDB_SERVER_PW
+            connection = valkey.Valkey(
+                connection_pool=valkey.BlockingConnectionPool(
+                    max_connections=SCHEDULER.kvdb_pool_size, **kwargs))
+            connection.ping()
+            _resource_connection = connection
+    return _resource_connection
+
+
+def getResourceLogger():
+    """Return the ResourceLogger shared by the process, so its connection
+    pool is only created once.
+    """
+    global _resource_logger
+    with _logger_lock:
+        if _resource_logger is None:
+            kwargs = dict()
+            kwargs['host'] = global_config.KVDB_SERVER_URL
+            kwargs['port'] = global_config.KVDB_SERVER_PORT
+            if (global_config.KVDB_SERVER_PW and
+                    global_config.KVDB_SERVER_PW is not None):
+                kwargs['password'] = global_config.KVDB_SERVER_PW
+            _resource_logger = ResourceLogger(**kwargs)
+    return _resource_logger
+
+
+def getMessageLogger():
+    """Return the MessageLogger shared by the process, so e.g. the fluentd
+    sender is only created once.
+    """
+    global _message_logger
+    with _logger_lock:
+        if _message_logger is None:
+            _message_logger = MessageLogger()
+    return _message_logger
+
 
 class ParallelResourceBase(ResourceBase):
     """This is the base class for all asynchronous and synchronous processing
@@ -64,16 +128,8 @@ class ParallelResourceBase(ResourceBase):
         self.orig_time = time.time()
         self.orig_datetime = str(datetime.now())
 
-        kwargs = dict()
-        kwargs['host'] = global_config.KVDB_SERVER_URL
-        kwargs['port'] = global_config.KVDB_SERVER_PORT
-        if (global_config.KVDB_SERVER_PW and
-                global_config.KVDB_SERVER_PW is not None):
-            kwargs['password'] = global_config.KVDB_SERVER_PW
-        self.resource_logger = ResourceLogger(**kwargs)
-        del kwargs
-
-        self.message_logger = MessageLogger()
+        self.resource_logger = getResourceLogger()
+        self.message_logger = getMessageLogger()
 
         self.grass_data_base = global_config.GRASS_DATABASE
         self.grass_user_data_base = global_config.GRASS_USER_DATABASE
@@ -126,7 +182,8 @@ class ParallelResourceBase(ResourceBase):
         self.api_info = ApiInfoModel(**kwargs)
 
     def preprocess(self, has_json=True, has_xml=False,
-                   project_name=None, mapset_name=None, map_name=None):
+                   project_name=None, mapset_name=None, map_name=None,
+                   commit=True):
         """Preprocessing steps for asynchronous processing
 
             - Check if the request has a data field
@@ -145,6 +202,9 @@ class ParallelResourceBase(ResourceBase):
                                computation should be performed
             map_name: The name of the map or other resource (raster, vector,
                       STRDS, color, ...)
+            commit (bool): Set False if the accept entry is sent to the
+                           resource kvdb database by the caller, e.g.
+                           together with the entries of other jobs
 
         Returns:
             The ResourceDataContainer that contains all required information
@@ -187,8 +247,10 @@ class ParallelResourceBase(ResourceBase):
             api_info=self.api_info)
 
         # Send the status to the database
-        self.resource_logger.commit(
-            self.user_id, self.resource_id, self.iteration, self.response_data)
+        if commit is True:
+            self.resource_logger.commit(
+                self.user_id, self.resource_id, self.iteration,
+                self.response_data)
 
         # Return the ResourceDataContainer that includes all
         # required data for the asynchronous processing
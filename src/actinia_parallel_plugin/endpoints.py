@@ -26,13 +26,20 @@ __maintainer__ = "mundialis GmbH % Co. KG"
 
 from flask_restful_swagger_2 import Resource
 
-from actinia_parallel_plugin.api.batch import BatchJobsId
+from actinia_parallel_plugin.api.batch import (
+    BatchJobsId,
+    BatchJobsPause,
+    BatchJobsRerun,
+    BatchJobsResume,
+)
 from actinia_parallel_plugin.api.job import JobId
 # from actinia_parallel_plugin.api.parallel_processing import \
 #     AsyncParallelPersistentResource
 from actinia_parallel_plugin.api.parallel_ephemeral_processing import \
     AsyncParallelEphermeralResource
+from actinia_parallel_plugin.core.batches import reapJobsInBackground
 from actinia_parallel_plugin.core.jobtable import initJobDB, applyMigrations
+from actinia_parallel_plugin.resources.config import SCHEDULER
 
 
 def get_endpoint_class_name(
@@ -90,11 +97,24 @@ def create_endpoints(flask_api):
     # GET batch jobs TODO
     # "/resources/<string:user_id>/batches"
 
-    # GET batch jobs by ID
+    # GET and DELETE batch jobs by ID
     apidoc.add_resource(
         BatchJobsId,
         "/resources/<string:user_id>/batches/<int:batchid>")
 
+    # POST rerun the failed jobs of a batch
+    apidoc.add_resource(
+        BatchJobsRerun,
+        "/resources/<string:user_id>/batches/<int:batchid>/rerun")
+
+    # POST pause and resume a batch
+    apidoc.add_resource(
+        BatchJobsPause,
+        "/resources/<string:user_id>/batches/<int:batchid>/pause")
+    apidoc.add_resource(
+        BatchJobsResume,
+        "/resources/<string:user_id>/batches/<int:batchid>/resume")
+
     # GET all jobs of one batch TODO
     # "/resources/<string:user_id>/batches/<int:batchid>/jobs"
 
@@ -106,3 +126,8 @@ def create_endpoints(flask_api):
     # initilalize jobtable
     initJobDB()
     applyMigrations()
+
+    # without dispatcher, the jobs of dead workers are recovered by every
+    # actinia process
+    if SCHEDULER.use_dispatcher is False:
+        reapJobsInBackground()
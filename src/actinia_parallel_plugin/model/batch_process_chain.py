@@ -25,7 +25,7 @@ __copyright__ = "Copyright 2021-2022 mundialis GmbH & Co. KG"
 __maintainer__ = "mundialis GmbH % Co. KG"
 
 
-from jsonmodels import models, fields
+from jsonmodels import models, fields, validators
 
 
 class ModuleStdOut(models.Base):
@@ -79,13 +79,33 @@ class Module(models.Base):
     outputs = fields.ListField([ModuleOutput])
 
 
+class RetryPolicy(models.Base):
+    """Model for object in BatchProcessChain
+
+    Model for the optional retry policy of the batch or of a job
+    """
+    max_attempts = fields.IntField(required=True)  # including the first
+    backoff = fields.FloatField()  # seconds before the second attempt
+    backoff_factor = fields.FloatField()  # growth of backoff per attempt
+    errors = fields.ListField([str])  # regex of retryable error messages
+
+
 class Job(models.Base):
     """Model for object in BatchProcessChain
 
     Model for each job in jobs array
     """
     version = fields.StringField()  # string
-    parallel = fields.StringField(required=True)  # bool
+    # id of the job inside the batch, only needed for depends_on
+    id = fields.StringField()  # string
+    parallel = fields.StringField()  # bool
+    # ids of the jobs which have to finish successfully before this job
+    depends_on = fields.ListField([str])  # array of strings
+    # overwrites the retry policy of the batch
+    retry = fields.EmbeddedField(RetryPolicy)
+    # overwrites the min_success_ratio of the batch
+    min_success_ratio = fields.FloatField(
+        nullable=True, validators=[validators.Min(0), validators.Max(1)])
     list = fields.ListField([Module], required=True)  # array of objects
     # the block and batch id is not in the json but is filled later
     batch_processing_block = fields.IntField()
@@ -102,3 +122,16 @@ class BatchProcessChain(models.Base):
     # processing_platform_name = fields.StringField()  # string
     # processing_host = fields.StringField()  # string
     jobs = fields.ListField([Job], required=True)  # array of objects
+    # maximal number of jobs of the batch running at the same time
+    max_parallel = fields.IntField()  # integer
+    # jobs of batches with higher priority are started first
+    priority = fields.IntField()  # integer
+    # jobs of batches with an earlier deadline are started first
+    deadline = fields.DateTimeField()  # ISO 8601 string
+    # restart failed jobs
+    retry = fields.EmbeddedField(RetryPolicy)
+    # share of the dependencies of a job which have to finish successfully
+    min_success_ratio = fields.FloatField(
+        nullable=True, validators=[validators.Min(0), validators.Max(1)])
+    # terminate the other jobs of the batch when a job failed
+    fail_fast = fields.BoolField()  # bool
@@ -24,8 +24,16 @@ __author__ = "Carmen Tawalika, Anika Weinmann"
 __copyright__ = "Copyright 2018-2022 mundialis GmbH & Co. KG"
 __maintainer__ = "mundialis GmbH % Co. KG"
 
-from peewee import Model, CharField, DateTimeField, AutoField, IntegerField
-from playhouse.postgres_ext import BinaryJSONField
+from peewee import (
+    Model,
+    BooleanField,
+    CharField,
+    CompositeKey,
+    DateTimeField,
+    AutoField,
+    IntegerField,
+)
+from playhouse.postgres_ext import BinaryJSONField, DateTimeTZField
 from playhouse.pool import PooledPostgresqlExtDatabase
 
 from actinia_parallel_plugin.resources.config import JOBTABLE
@@ -45,8 +53,10 @@ jobdb = PooledPostgresqlExtDatabase(
         'port': JOBTABLE.port,
         'user': JOBTABLE.user,
         'password': JOBTABLE.pw,
-        'max_connections': 8,
-        'stale_timeout': 300
+        'max_connections': JOBTABLE.pool_size,
+        'stale_timeout': 300,
+        # wait for a free connection instead of failing at once
+        'timeout': JOBTABLE.pool_timeout
     }
 )
 
@@ -66,6 +76,8 @@ class Job(BaseModel):
     time_started = DateTimeField(null=True)
     time_estimated = DateTimeField(null=True)
     time_ended = DateTimeField(null=True)
+    time_heartbeat = DateTimeField(null=True)
+    time_next_attempt = DateTimeField(null=True)
     status = CharField(null=True)
     creation_uuid = CharField(null=True)
     resource_response = BinaryJSONField(null=True)
@@ -77,7 +89,62 @@ class Job(BaseModel):
     # add a potential parent_job
     batch_id = IntegerField(null=True)
     batch_processing_block = IntegerField(null=True)
+    # ids of the jobs of the batch which have to finish before this job
+    depends_on = BinaryJSONField(null=True)
+    deps_remaining = IntegerField(null=True)
+    # failed dependencies, the job is only started if they are tolerated
+    deps_failed = IntegerField(default=0)
+    deps_failures_allowed = IntegerField(default=0)
+    # number of times the job was started
+    attempts = IntegerField(default=0)
 
     class Meta:
         table_name = JOBTABLE.table
         schema = JOBTABLE.schema
+
+
+class Batch(BaseModel):
+    """Model for batch table in database
+
+    The table is created by the yoyo migrations, its serial id is used to
+    allocate new batch ids. The other columns are needed to start the jobs
+    of the batch outside of the POST request.
+    """
+    id = AutoField()
+    time_created = DateTimeField(null=True)
+    user_id = CharField(null=True)
+    project_name = CharField(null=True)
+    process = CharField(null=True)
+    api_info = BinaryJSONField(null=True)
+    max_parallel = IntegerField(null=True)
+    priority = IntegerField(default=0)
+    deadline = DateTimeTZField(null=True)
+    retry = BinaryJSONField(null=True)
+    fail_fast = BooleanField(default=False)
+    # no jobs of a paused batch are started
+    paused = BooleanField(default=False)
+
+    class Meta:
+        table_name = JOBTABLE.batch_table
+        schema = JOBTABLE.schema
+
+
+class BatchBlock(BaseModel):
+    """Model for processing block table in database
+
+    The table is created by the yoyo migrations and counts the jobs of each
+    processing block which have not yet finished. For batches without
+    dependencies between single jobs, the counter is the barrier the jobs
+    of the next block wait for.
+    """
+    batch_id = IntegerField()
+    batch_processing_block = IntegerField()
+    jobs_total = IntegerField()
+    jobs_remaining = IntegerField()
+    # jobs of the block which ended with an error or were terminated
+    jobs_failed = IntegerField(default=0)
+
+    class Meta:
+        table_name = JOBTABLE.block_table
+        schema = JOBTABLE.schema
+        primary_key = CompositeKey('batch_id', 'batch_processing_block')
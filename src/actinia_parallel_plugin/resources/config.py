@@ -26,6 +26,7 @@ __maintainer__ = "mundialis GmbH % Co. KG"
 
 import configparser
 import os
+from math import inf
 # from pathlib import Path
 
 
@@ -54,9 +55,55 @@ class JOBTABLE:
     pw = 'gis'
     schema = 'actinia'
     table = 'tab_jobs'
+    batch_table = 'tab_batches'
+    block_table = 'tab_batch_blocks'
     id_field = 'id'
     batch_id_field = "batch_id"
     resource_id_field = "resource_id"
+    # connections of the connection pool of a process and seconds to wait
+    # for a free connection before an error is raised
+    pool_size = 8
+    pool_timeout = 30
+
+
+class SCHEDULER:
+    """Default config for starting the jobs of batches, 0 means unlimited
+    """
+    max_parallel = 0
+    max_parallel_per_user = 0
+    max_parallel_per_batch = 0
+    # weights of the users for sharing max_parallel, default is 1
+    shares = dict()
+    # if True, the jobs are only started by the dispatcher process and not
+    # by the workers
+    use_dispatcher = False
+    # maximal number of jobs claimed by one release, so a release only reads
+    # and locks a bounded number of ready jobs per batch and per user
+    claim_limit = 1000
+    # seconds for which a process reuses the estimated slacks of the
+    # batches with a deadline
+    slack_interval = 60
+    # seconds between the polls of the dispatcher or, without dispatcher,
+    # between the checks for jobs whose retry backoff ended
+    dispatch_interval = 5
+    # the workers write a heartbeat every heartbeat_interval seconds; jobs
+    # without heartbeat for heartbeat_timeout seconds are started again by
+    # the reaper up to max_attempts times; the reaper runs every
+    # reap_interval seconds in the dispatcher or, without dispatcher, in
+    # every actinia process
+    heartbeat_interval = 30
+    heartbeat_timeout = 300
+    reap_interval = 60
+    max_attempts = 3
+    # number of threads starting the jobs of a block concurrently, each
+    # needs a connection of the jobtable connection pool, so it is limited
+    # to JOBTABLE.pool_size - 1
+    start_threads = 4
+    # connections of the KVDB connection pool shared by the threads
+    kvdb_pool_size = 16
+    # seconds the parts shared by the enqueued jobs of a block, e.g. the
+    # user credentials, are kept if KVDB_QUEUE_JOB_TTL is not set
+    shared_parts_ttl = 86400
 
 
 class LOGCONFIG:
@@ -67,6 +114,37 @@ class LOGCONFIG:
     type = 'stdout'
 
 
+def _getPositiveInt(config, section, option):
+    """Read an integer option of the config which has to be at least 1."""
+    value = config.getint(section, option)
+    if value < 1:
+        raise ValueError(
+            f"Option {option} of section {section} has to be at least 1, "
+            f"not {value}.")
+    return value
+
+
+def _parseShares(shares):
+    """Parse the shares of the users, e.g. "user1:4, user2:1", into a dict.
+    Every share has to be a positive number.
+    """
+    shares_dict = dict()
+    for entry in shares.split(","):
+        if entry.strip() == "":
+            continue
+        user_id, _, share = entry.rpartition(":")
+        try:
+            share = float(share)
+        except ValueError:
+            share = None
+        if user_id.strip() == "" or share is None or not 0 < share < inf:
+            raise ValueError(
+                f"Invalid entry '{entry.strip()}' of the shares, expected "
+                "<user_id>:<positive number>.")
+        shares_dict[user_id.strip()] = share
+    return shares_dict
+
+
 class Configfile:
 
     def __init__(self):
@@ -102,8 +180,18 @@ class Configfile:
                 JOBTABLE.schema = config.get("JOBTABLE", "schema")
             if config.has_option("JOBTABLE", "table"):
                 JOBTABLE.table = config.get("JOBTABLE", "table")
+            if config.has_option("JOBTABLE", "batch_table"):
+                JOBTABLE.batch_table = config.get("JOBTABLE", "batch_table")
+            if config.has_option("JOBTABLE", "block_table"):
+                JOBTABLE.block_table = config.get("JOBTABLE", "block_table")
             if config.has_option("JOBTABLE", "id_field"):
                 JOBTABLE.id_field = config.get("JOBTABLE", "id_field")
+            if config.has_option("JOBTABLE", "pool_size"):
+                JOBTABLE.pool_size = _getPositiveInt(
+                    config, "JOBTABLE", "pool_size")
+            if config.has_option("JOBTABLE", "pool_timeout"):
+                JOBTABLE.pool_timeout = config.getfloat(
+                    "JOBTABLE", "pool_timeout")
 
         # overwrite values if ENV values exist:
         if os.environ.get('JOBTABLE_USER'):
@@ -111,6 +199,59 @@ class Configfile:
         if os.environ.get('JOBTABLE_PW'):
             JOBTABLE.pw = os.environ['JOBTABLE_PW']
 
+        # SCHEDULER
+        if config.has_section("SCHEDULER"):
+            if config.has_option("SCHEDULER", "max_parallel"):
+                SCHEDULER.max_parallel = config.getint(
+                    "SCHEDULER", "max_parallel")
+            if config.has_option("SCHEDULER", "max_parallel_per_user"):
+                SCHEDULER.max_parallel_per_user = config.getint(
+                    "SCHEDULER", "max_parallel_per_user")
+            if config.has_option("SCHEDULER", "max_parallel_per_batch"):
+                SCHEDULER.max_parallel_per_batch = config.getint(
+                    "SCHEDULER", "max_parallel_per_batch")
+            if config.has_option("SCHEDULER", "claim_limit"):
+                SCHEDULER.claim_limit = _getPositiveInt(
+                    config, "SCHEDULER", "claim_limit")
+            if config.has_option("SCHEDULER", "slack_interval"):
+                SCHEDULER.slack_interval = config.getfloat(
+                    "SCHEDULER", "slack_interval")
+            if config.has_option("SCHEDULER", "use_dispatcher"):
+                SCHEDULER.use_dispatcher = config.getboolean(
+                    "SCHEDULER", "use_dispatcher")
+            if config.has_option("SCHEDULER", "dispatch_interval"):
+                SCHEDULER.dispatch_interval = config.getfloat(
+                    "SCHEDULER", "dispatch_interval")
+            if config.has_option("SCHEDULER", "heartbeat_interval"):
+                SCHEDULER.heartbeat_interval = config.getfloat(
+                    "SCHEDULER", "heartbeat_interval")
+            if config.has_option("SCHEDULER", "heartbeat_timeout"):
+                SCHEDULER.heartbeat_timeout = config.getfloat(
+                    "SCHEDULER", "heartbeat_timeout")
+            if config.has_option("SCHEDULER", "reap_interval"):
+                SCHEDULER.reap_interval = config.getfloat(
+                    "SCHEDULER", "reap_interval")
+            if config.has_option("SCHEDULER", "max_attempts"):
+                SCHEDULER.max_attempts = config.getint(
+                    "SCHEDULER", "max_attempts")
+            if config.has_option("SCHEDULER", "start_threads"):
+                SCHEDULER.start_threads = _getPositiveInt(
+                    config, "SCHEDULER", "start_threads")
+            if config.has_option("SCHEDULER", "kvdb_pool_size"):
+                SCHEDULER.kvdb_pool_size = _getPositiveInt(
+                    config, "SCHEDULER", "kvdb_pool_size")
+            if config.has_option("SCHEDULER", "shared_parts_ttl"):
+                SCHEDULER.shared_parts_ttl = _getPositiveInt(
+                    config, "SCHEDULER", "shared_parts_ttl")
+            if config.has_option("SCHEDULER", "shares"):
+                SCHEDULER.shares = _parseShares(
+                    config.get("SCHEDULER", "shares"))
+
+        # one connection of the jobtable pool is left for the heartbeats and
+        # requests of the process while the threads start jobs
+        SCHEDULER.start_threads = max(
+            1, min(SCHEDULER.start_threads, JOBTABLE.pool_size - 1))
+
         # LOGGING
         if config.has_section("LOGCONFIG"):
             if config.has_option("LOGCONFIG", "logfile"):
@@ -0,0 +1,30 @@
+'''
+Create the batch table. Its serial primary key replaces the computation of
+a new batch id from all batch ids in the jobtable, so allocating a batch id
+is constant-time and safe if several workers create batches at once.
+The ids of already existing batches are taken over and the sequence is set
+behind the highest one.
+'''
+
+from yoyo import step
+from actinia_parallel_plugin.resources.config import JOBTABLE
+
+steps = [
+  step(
+      "CREATE TABLE IF NOT EXISTS %s ("
+      "id SERIAL PRIMARY KEY, "
+      "time_created TIMESTAMP)" % JOBTABLE.batch_table,
+      "DROP TABLE %s" % JOBTABLE.batch_table
+  ),
+  step(
+      "INSERT INTO %s (id) SELECT DISTINCT %s FROM %s WHERE %s IS NOT NULL "
+      "ON CONFLICT DO NOTHING" % (
+          JOBTABLE.batch_table, JOBTABLE.batch_id_field, JOBTABLE.table,
+          JOBTABLE.batch_id_field)
+  ),
+  step(
+      "SELECT setval(pg_get_serial_sequence('%s', 'id'), "
+      "COALESCE(MAX(id), 0) + 1, false) FROM %s" % (
+          JOBTABLE.batch_table, JOBTABLE.batch_table)
+  )
+]
@@ -0,0 +1,41 @@
+'''
+Add indexes for the columns of the jobtable which are used to poll batches
+and to find jobs by their actinia-core resource id. Without them every
+status request is a sequential scan over all jobs ever created.
+
+The indexes are created concurrently to not lock the jobtable of a running
+instance, which is not possible inside a transaction.
+'''
+
+from yoyo import step
+from actinia_parallel_plugin.resources.config import JOBTABLE
+
+__transactional__ = False
+
+TABLE = JOBTABLE.table
+BATCH_ID = JOBTABLE.batch_id_field
+RESOURCE_ID = JOBTABLE.resource_id_field
+
+steps = [
+  step(
+      "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_%s_batch_id "
+      "ON %s (%s)" % (TABLE, TABLE, BATCH_ID),
+      "DROP INDEX IF EXISTS idx_%s_batch_id" % TABLE
+  ),
+  step(
+      "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_%s_batch_id_block "
+      "ON %s (%s, batch_processing_block)" % (TABLE, TABLE, BATCH_ID),
+      "DROP INDEX IF EXISTS idx_%s_batch_id_block" % TABLE
+  ),
+  step(
+      "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_%s_resource_id "
+      "ON %s (%s)" % (TABLE, TABLE, RESOURCE_ID),
+      "DROP INDEX IF EXISTS idx_%s_resource_id" % TABLE
+  ),
+  step(
+      "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_%s_status_active "
+      "ON %s (status) "
+      "WHERE status IN ('PREPARING', 'PENDING', 'RUNNING')" % (TABLE, TABLE),
+      "DROP INDEX IF EXISTS idx_%s_status_active" % TABLE
+  )
+]
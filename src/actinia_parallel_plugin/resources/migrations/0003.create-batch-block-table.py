@@ -0,0 +1,21 @@
+'''
+Create the processing block table. For every processing block of a batch
+it counts the jobs which have not yet finished successfully, so a finished
+job only has to decrement one counter instead of reading all jobs of the
+batch to find out if its block is done.
+'''
+
+from yoyo import step
+from actinia_parallel_plugin.resources.config import JOBTABLE
+
+steps = [
+  step(
+      "CREATE TABLE IF NOT EXISTS %s ("
+      "batch_id INTEGER NOT NULL, "
+      "batch_processing_block INTEGER NOT NULL, "
+      "jobs_total INTEGER NOT NULL, "
+      "jobs_remaining INTEGER NOT NULL, "
+      "PRIMARY KEY (batch_id, batch_processing_block))" % JOBTABLE.block_table,
+      "DROP TABLE %s" % JOBTABLE.block_table
+  )
+]
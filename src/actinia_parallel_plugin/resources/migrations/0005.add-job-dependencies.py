@@ -0,0 +1,33 @@
+'''
+Add the dependencies of the jobs of a batch to the jobtable. depends_on
+holds the ids of the jobs which have to finish successfully before a job
+is started, deps_remaining counts how many of them have not yet finished.
+The GIN index is used to find the jobs depending on a finished job.
+
+The index is created concurrently to not lock the jobtable of a running
+instance, which is not possible inside a transaction.
+'''
+
+from yoyo import step
+from actinia_parallel_plugin.resources.config import JOBTABLE
+
+__transactional__ = False
+
+TABLE = JOBTABLE.table
+
+steps = [
+  step(
+      "ALTER TABLE %s ADD COLUMN IF NOT EXISTS depends_on JSONB" % TABLE,
+      "ALTER TABLE %s DROP COLUMN IF EXISTS depends_on" % TABLE
+  ),
+  step(
+      "ALTER TABLE %s ADD COLUMN IF NOT EXISTS deps_remaining INTEGER"
+      % TABLE,
+      "ALTER TABLE %s DROP COLUMN IF EXISTS deps_remaining" % TABLE
+  ),
+  step(
+      "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_%s_depends_on "
+      "ON %s USING GIN (depends_on jsonb_path_ops)" % (TABLE, TABLE),
+      "DROP INDEX IF EXISTS idx_%s_depends_on" % TABLE
+  )
+]
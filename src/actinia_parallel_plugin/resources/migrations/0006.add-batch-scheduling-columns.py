@@ -0,0 +1,32 @@
+'''
+Add the columns to the batch table which are needed to start the jobs of a
+batch later on, e.g. when a running job of the same user finished, and the
+maximal number of parallel jobs of the batch.
+'''
+
+from yoyo import step
+from actinia_parallel_plugin.resources.config import JOBTABLE
+
+TABLE = JOBTABLE.batch_table
+
+steps = [
+  step(
+      "ALTER TABLE %s "
+      "ADD COLUMN IF NOT EXISTS user_id VARCHAR, "
+      "ADD COLUMN IF NOT EXISTS project_name VARCHAR, "
+      "ADD COLUMN IF NOT EXISTS process VARCHAR, "
+      "ADD COLUMN IF NOT EXISTS api_info JSONB, "
+      "ADD COLUMN IF NOT EXISTS max_parallel INTEGER" % TABLE,
+      "ALTER TABLE %s "
+      "DROP COLUMN IF EXISTS user_id, "
+      "DROP COLUMN IF EXISTS project_name, "
+      "DROP COLUMN IF EXISTS process, "
+      "DROP COLUMN IF EXISTS api_info, "
+      "DROP COLUMN IF EXISTS max_parallel" % TABLE
+  ),
+  step(
+      "CREATE INDEX IF NOT EXISTS idx_%s_user_id ON %s (user_id)"
+      % (TABLE, TABLE),
+      "DROP INDEX IF EXISTS idx_%s_user_id" % TABLE
+  )
+]
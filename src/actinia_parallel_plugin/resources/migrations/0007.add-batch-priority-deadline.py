@@ -0,0 +1,21 @@
+'''
+Add the priority and the optional deadline of a batch to the batch table.
+They determine the order in which the ready jobs of the batches are
+started.
+'''
+
+from yoyo import step
+from actinia_parallel_plugin.resources.config import JOBTABLE
+
+TABLE = JOBTABLE.batch_table
+
+steps = [
+  step(
+      "ALTER TABLE %s "
+      "ADD COLUMN IF NOT EXISTS priority INTEGER NOT NULL DEFAULT 0, "
+      "ADD COLUMN IF NOT EXISTS deadline TIMESTAMP WITH TIME ZONE" % TABLE,
+      "ALTER TABLE %s "
+      "DROP COLUMN IF EXISTS priority, "
+      "DROP COLUMN IF EXISTS deadline" % TABLE
+  )
+]
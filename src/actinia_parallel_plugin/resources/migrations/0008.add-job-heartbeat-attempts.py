@@ -0,0 +1,21 @@
+'''
+Add the heartbeat and the number of start attempts to the jobtable. The
+heartbeat is written periodically by the worker processing the job, so jobs
+of dead workers can be detected and started again.
+'''
+
+from yoyo import step
+from actinia_parallel_plugin.resources.config import JOBTABLE
+
+TABLE = JOBTABLE.table
+
+steps = [
+  step(
+      "ALTER TABLE %s "
+      "ADD COLUMN IF NOT EXISTS time_heartbeat TIMESTAMP, "
+      "ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0" % TABLE,
+      "ALTER TABLE %s "
+      "DROP COLUMN IF EXISTS time_heartbeat, "
+      "DROP COLUMN IF EXISTS attempts" % TABLE
+  )
+]
@@ -0,0 +1,21 @@
+'''
+Add the retry policy of a batch to the batch table and the earliest time
+for the next attempt of a failed job to the jobtable.
+'''
+
+from yoyo import step
+from actinia_parallel_plugin.resources.config import JOBTABLE
+
+steps = [
+  step(
+      "ALTER TABLE %s ADD COLUMN IF NOT EXISTS retry JSONB"
+      % JOBTABLE.batch_table,
+      "ALTER TABLE %s DROP COLUMN IF EXISTS retry" % JOBTABLE.batch_table
+  ),
+  step(
+      "ALTER TABLE %s ADD COLUMN IF NOT EXISTS time_next_attempt TIMESTAMP"
+      % JOBTABLE.table,
+      "ALTER TABLE %s DROP COLUMN IF EXISTS time_next_attempt"
+      % JOBTABLE.table
+  )
+]
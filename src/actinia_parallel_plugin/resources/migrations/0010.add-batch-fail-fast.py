@@ -0,0 +1,14 @@
+'''
+Add the fail_fast option of a batch to the batch table.
+'''
+
+from yoyo import step
+from actinia_parallel_plugin.resources.config import JOBTABLE
+
+steps = [
+  step(
+      "ALTER TABLE %s ADD COLUMN IF NOT EXISTS fail_fast BOOLEAN "
+      "NOT NULL DEFAULT FALSE" % JOBTABLE.batch_table,
+      "ALTER TABLE %s DROP COLUMN IF EXISTS fail_fast" % JOBTABLE.batch_table
+  )
+]
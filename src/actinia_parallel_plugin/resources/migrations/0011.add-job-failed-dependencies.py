@@ -0,0 +1,21 @@
+'''
+Add the number of failed dependencies of a job and the number of failed
+dependencies it tolerates to the jobtable.
+'''
+
+from yoyo import step
+from actinia_parallel_plugin.resources.config import JOBTABLE
+
+steps = [
+  step(
+      "ALTER TABLE %s ADD COLUMN IF NOT EXISTS deps_failed INTEGER "
+      "NOT NULL DEFAULT 0" % JOBTABLE.table,
+      "ALTER TABLE %s DROP COLUMN IF EXISTS deps_failed" % JOBTABLE.table
+  ),
+  step(
+      "ALTER TABLE %s ADD COLUMN IF NOT EXISTS deps_failures_allowed INTEGER "
+      "NOT NULL DEFAULT 0" % JOBTABLE.table,
+      "ALTER TABLE %s DROP COLUMN IF EXISTS deps_failures_allowed"
+      % JOBTABLE.table
+  )
+]
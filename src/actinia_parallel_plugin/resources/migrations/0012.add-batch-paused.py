@@ -0,0 +1,14 @@
+'''
+Add the paused state of a batch to the batch table.
+'''
+
+from yoyo import step
+from actinia_parallel_plugin.resources.config import JOBTABLE
+
+steps = [
+  step(
+      "ALTER TABLE %s ADD COLUMN IF NOT EXISTS paused BOOLEAN "
+      "NOT NULL DEFAULT FALSE" % JOBTABLE.batch_table,
+      "ALTER TABLE %s DROP COLUMN IF EXISTS paused" % JOBTABLE.batch_table
+  )
+]
@@ -0,0 +1,16 @@
+'''
+Add the number of failed jobs of a processing block to the processing block
+table, so the jobs of the next block can check their min_success_ratio
+without an edge to every job of the block.
+'''
+
+from yoyo import step
+from actinia_parallel_plugin.resources.config import JOBTABLE
+
+steps = [
+  step(
+      "ALTER TABLE %s ADD COLUMN IF NOT EXISTS jobs_failed INTEGER "
+      "NOT NULL DEFAULT 0" % JOBTABLE.block_table,
+      "ALTER TABLE %s DROP COLUMN IF EXISTS jobs_failed" % JOBTABLE.block_table
+  )
+]
@@ -0,0 +1,25 @@
+'''
+Add an index for the jobs which were set to PREPARING to be started again
+after a backoff, so the actinia processes can check cheaply if the backoff
+of a job ended without dispatcher.
+
+The index is created concurrently to not lock the jobtable of a running
+instance, which is not possible inside a transaction.
+'''
+
+from yoyo import step
+from actinia_parallel_plugin.resources.config import JOBTABLE
+
+__transactional__ = False
+
+TABLE = JOBTABLE.table
+
+steps = [
+  step(
+      "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_%s_next_attempt "
+      "ON %s (time_next_attempt) "
+      "WHERE status = 'PREPARING' AND time_next_attempt IS NOT NULL"
+      % (TABLE, TABLE),
+      "DROP INDEX IF EXISTS idx_%s_next_attempt" % TABLE
+  )
+]
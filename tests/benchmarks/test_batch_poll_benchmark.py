@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2022 mundialis GmbH & Co. KG
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Benchmark for polling the status of a batch from a growing jobtable
+"""
+
+__license__ = "GPLv3"
+__author__ = "Anika Weinmann"
+__copyright__ = "Copyright 2022 mundialis GmbH & Co. KG"
+__maintainer__ = "mundialis GmbH % Co. KG"
+
+import os
+import statistics
+import time
+
+import pytest
+
+import actinia_parallel_plugin
+from actinia_parallel_plugin.core.batches import createBatchId
+from actinia_parallel_plugin.core.jobtable import (
+    applyMigrations,
+    getAllJobs,
+    initJobDB,
+    insertNewJobs,
+)
+from actinia_parallel_plugin.model.jobtable import Batch, Job, jobdb
+from actinia_parallel_plugin.resources.logging import log
+
+# number of jobs in the jobtable for which the poll latency is measured
+TABLE_SIZES = [1000, 10000, 100000]
+# number of jobs of every batch
+BATCH_SIZE = 100
+# number of polls per table size
+NUM_POLLS = 50
+
+JOB = {
+    "list": [
+        {
+            "module": "g.region",
+            "id": "g_region_benchmark",
+            "inputs": [{"param": "raster", "value": "elevation@PERMANENT"}],
+        }
+    ],
+    "parallel": "true",
+    "version": "1",
+}
+
+
+def fill_jobtable(num_batches):
+    """Insert num_batches batches with BATCH_SIZE jobs each."""
+    batch_ids = []
+    for _ in range(num_batches):
+        batch_id = createBatchId()
+        jobs = [
+            {**JOB, "batch_id": batch_id, "batch_processing_block": 1}
+            for _ in range(BATCH_SIZE)
+        ]
+        insertNewJobs(jobs)
+        batch_ids.append(batch_id)
+    with jobdb:
+        jobdb.execute_sql(f"ANALYZE {Job._meta.schema}.{Job._meta.table_name}")
+    return batch_ids
+
+
+def poll_latency(batch_id):
+    """Return the median latency of polling all jobs of a batch."""
+    latencies = []
+    for _ in range(NUM_POLLS):
+        start = time.perf_counter()
+        jobs = getAllJobs({"batch_id": batch_id})
+        latencies.append(time.perf_counter() - start)
+        assert len(jobs) == BATCH_SIZE
+    return statistics.median(latencies)
+
+
+@pytest.fixture
+def jobtable(monkeypatch):
+    """Create the jobtable with the indexes and the batch table."""
+    # the migrations are read relative to the parent of the package
+    monkeypatch.chdir(
+        os.path.dirname(os.path.dirname(actinia_parallel_plugin.__file__)))
+    initJobDB()
+    applyMigrations()
+
+
+@pytest.mark.benchmark
+def test_batch_poll_latency(jobtable, record_property):
+    """Poll latency of a batch has to stay flat while the jobtable grows."""
+    batch_ids = []
+    latencies = {}
+    try:
+        for table_size in TABLE_SIZES:
+            num_batches = table_size // BATCH_SIZE - len(batch_ids)
+            batch_ids.extend(fill_jobtable(num_batches))
+            latencies[table_size] = poll_latency(batch_ids[0])
+            record_property(
+                f"poll_latency_{table_size}", latencies[table_size])
+            log.info(
+                f"Polling {BATCH_SIZE} of {table_size} jobs: "
+                f"{latencies[table_size] * 1000:.2f} ms"
+            )
+    finally:
+        with jobdb:
+            Job.delete().where(Job.batch_id.in_(batch_ids)).execute()
+            Batch.delete().where(Batch.id.in_(batch_ids)).execute()
+        jobdb.close()
+
+    smallest = latencies[TABLE_SIZES[0]]
+    largest = latencies[TABLE_SIZES[-1]]
+    # allow some noise but no growth with the table size
+    assert largest < 3 * smallest + 0.005, (
+        f"Poll latency grows with the jobtable: {latencies}"
+    )
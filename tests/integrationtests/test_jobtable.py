@@ -0,0 +1,403 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2022 mundialis GmbH & Co. KG
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Integration tests for the jobtable functions against the postgis database
+"""
+
+__license__ = "GPLv3"
+__author__ = "Anika Weinmann"
+__copyright__ = "Copyright 2022 mundialis GmbH & Co. KG"
+__maintainer__ = "mundialis GmbH % Co. KG"
+
+import os
+from uuid import uuid4
+
+import psycopg2
+import pytest
+
+import actinia_parallel_plugin
+from actinia_parallel_plugin.core.jobtable import (
+    allocateBatchId,
+    applyMigrations,
+    claimReadyJobs,
+    decrementBlockBarrier,
+    decrementDependentJobs,
+    getJobById,
+    initJobDB,
+    insertNewBatch,
+    insertNewJobs,
+    resetBatchJobs,
+    terminatePreparingJobs,
+    updateJobByID,
+)
+from actinia_parallel_plugin.model.jobtable import (
+    Batch,
+    BatchBlock,
+    Job,
+    jobdb,
+)
+from actinia_parallel_plugin.resources.config import JOBTABLE, SCHEDULER
+
+
+def rule_configurations(batch_id, blocks, **job_kwargs):
+    """Create the rule configurations of the jobs of a batch, one per entry
+    of blocks with the processing block of the job."""
+    return [
+        {"id": f"job_{idx}", "batch_id": batch_id,
+         "batch_processing_block": block, **job_kwargs}
+        for idx, block in enumerate(blocks)
+    ]
+
+
+def connect():
+    """Open a second connection to the jobtable database."""
+    return psycopg2.connect(
+        host=JOBTABLE.host,
+        port=JOBTABLE.port,
+        user=JOBTABLE.user,
+        password=JOBTABLE.pw,
+        dbname=JOBTABLE.database
+    )
+
+
+@pytest.fixture
+def jobtable(monkeypatch):
+    """Create the jobtable with the migrations and delete the batches and
+    jobs created by the test afterwards."""
+    # the migrations are read relative to the parent of the package
+    monkeypatch.chdir(
+        os.path.dirname(os.path.dirname(actinia_parallel_plugin.__file__)))
+    initJobDB()
+    applyMigrations()
+    batch_ids = []
+    yield batch_ids
+    with jobdb:
+        Job.delete().where(Job.batch_id.in_(batch_ids)).execute()
+        BatchBlock.delete().where(
+            BatchBlock.batch_id.in_(batch_ids)).execute()
+        Batch.delete().where(Batch.id.in_(batch_ids)).execute()
+    jobdb.close()
+
+
+@pytest.fixture
+def create_batch(jobtable):
+    """Insert a batch of a new user with its jobs, without dependencies if
+    neither dependencies nor block_sizes are given."""
+    user_id = f"user_{uuid4().hex}"
+
+    def _create_batch(blocks, dependencies=None, block_sizes=None,
+                      **job_kwargs):
+        if dependencies is None and block_sizes is None:
+            dependencies = [[] for _ in blocks]
+        batch_id = allocateBatchId()
+        jobtable.append(batch_id)
+        records = insertNewBatch(
+            batch_id, rule_configurations(batch_id, blocks, **job_kwargs),
+            dependencies=dependencies, block_sizes=block_sizes,
+            user_id=user_id)
+        return batch_id, records
+
+    return _create_batch
+
+
+def claim(batch_ids, **kwargs):
+    """Claim all ready jobs of the given batches."""
+    def select_jobs(active_counts, ready_jobs):
+        return [job["id"] for job in ready_jobs
+                if job["batch_id"] in batch_ids]
+    return claimReadyJobs(select_jobs, **kwargs)
+
+
+@pytest.mark.integrationtest
+def test_insertNewJobs_chunks(jobtable):
+    """Test that all chunks are inserted with the dependencies as job ids
+    """
+    batch_id = allocateBatchId()
+    jobtable.append(batch_id)
+    configurations = rule_configurations(batch_id, [1, 1, 1, 1, 1])
+    configurations[3]["min_success_ratio"] = 0.5
+    records = insertNewJobs(
+        configurations, dependencies=[[], [0], [0], [1, 2], []],
+        chunk_size=2)
+    ids = [record["id"] for record in records]
+    assert [record["rule_configuration"]["id"] for record in records] == [
+        "job_0", "job_1", "job_2", "job_3", "job_4"]
+    assert [record["depends_on"] for record in records] == [
+        [], [ids[0]], [ids[0]], [ids[1], ids[2]], []]
+    assert [record["deps_remaining"] for record in records] == [
+        0, 1, 1, 2, 0]
+    assert [record["deps_failures_allowed"] for record in records] == [
+        0, 0, 0, 1, 0]
+    assert all(record["status"] == "PREPARING" for record in records)
+
+
+@pytest.mark.integrationtest
+def test_insertNewBatch_block_sizes(create_batch):
+    """Test that the block counters are inserted with the batch and the
+    jobs of later blocks wait for their previous block
+    """
+    batch_id, records = create_batch(
+        [1, 1, 2], block_sizes={1: 2, 2: 1}, min_success_ratio=0.5)
+    assert [record["deps_remaining"] for record in records] == [0, 0, 1]
+    assert [record["deps_failures_allowed"] for record in records] == [
+        0, 0, 1]
+    with jobdb:
+        batch = Batch.get_by_id(batch_id)
+        blocks = list(BatchBlock.select(
+            BatchBlock.batch_processing_block, BatchBlock.jobs_remaining
+        ).where(BatchBlock.batch_id == batch_id).order_by(
+            BatchBlock.batch_processing_block).tuples())
+    jobdb.close()
+    assert batch.user_id is not None
+    assert blocks == [(1, 2), (2, 1)]
+
+
+@pytest.mark.integrationtest
+def test_updateJobByID_transitions(create_batch):
+    """Test that the status of a job can not go back and the final status
+    can not be changed anymore
+    """
+    _, records = create_batch([1])
+    jobid = records[0]["id"]
+    assert updateJobByID(
+        jobid, "accepted", {}, "resource_id-1")["status"] == "PENDING"
+    record = updateJobByID(jobid, "running", {}, "resource_id-1")
+    assert record["status"] == "RUNNING"
+    assert record["time_started"] is not None
+    # a late "accepted" status does not set the job back to PENDING
+    assert updateJobByID(jobid, "accepted", {}, "resource_id-1") is None
+    record = updateJobByID(jobid, "finished", {}, "resource_id-1")
+    assert record["status"] == "SUCCESS"
+    assert record["time_ended"] is not None
+    assert updateJobByID(jobid, "error", {}, "resource_id-1") is None
+    assert updateJobByID(jobid, "unknown", {}, "resource_id-1") is None
+    assert getJobById(jobid)[0]["status"] == "SUCCESS"
+
+
+@pytest.mark.integrationtest
+def test_updateJobByID_attempt(create_batch):
+    """Test that the worker of an earlier attempt can not update the job
+    """
+    batch_id, records = create_batch([1])
+    jobid = records[0]["id"]
+    claimed = claim([batch_id])
+    assert [record["id"] for record in claimed] == [jobid]
+    assert claimed[0]["attempts"] == 1
+    resource_id = claimed[0]["resource_id"]
+    assert updateJobByID(
+        jobid, "running", {}, resource_id, attempt=2) is None
+    assert updateJobByID(
+        jobid, "running", {}, "resource_id-old", checkResourceId=True
+    ) is None
+    record = updateJobByID(
+        jobid, "running", {}, resource_id, attempt=1, checkResourceId=True)
+    assert record["status"] == "RUNNING"
+
+
+@pytest.mark.integrationtest
+def test_claimReadyJobs(create_batch):
+    """Test that only the jobs without open dependencies are claimed and
+    get a resource id
+    """
+    batch_id, records = create_batch([1, 1, 2], dependencies=[[], [], [0]])
+    claimed = claim([batch_id])
+    assert [record["id"] for record in claimed] == [
+        records[0]["id"], records[1]["id"]]
+    assert all(record["status"] == "PENDING" for record in claimed)
+    assert all(record["resource_id"].startswith("resource_id-")
+               for record in claimed)
+    assert len({record["resource_id"] for record in claimed}) == 2
+    # the claimed jobs are not claimed again
+    assert claim([batch_id]) == []
+
+
+@pytest.mark.integrationtest
+def test_claimReadyJobs_skip_locked(create_batch):
+    """Test that ready jobs locked by another transaction are skipped
+    """
+    batch_id, records = create_batch([1, 1])
+    connection = connect()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id FROM {JOBTABLE.schema}.{JOBTABLE.table} "
+                "WHERE id = %s FOR UPDATE", (records[0]["id"],))
+            claimed = claim([batch_id])
+    finally:
+        connection.rollback()
+        connection.close()
+    assert [record["id"] for record in claimed] == [records[1]["id"]]
+    # the job is claimed the next time
+    claimed = claim([batch_id])
+    assert [record["id"] for record in claimed] == [records[0]["id"]]
+
+
+@pytest.mark.integrationtest
+def test_claimReadyJobs_no_wait(create_batch):
+    """Test that nothing is claimed without waiting while another process
+    holds the claim lock
+    """
+    batch_id, records = create_batch([1])
+    connection = connect()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_advisory_xact_lock(hashtext(%s))",
+                ("actinia-parallel-plugin.release",))
+            assert claim([batch_id], wait=False) == []
+    finally:
+        connection.rollback()
+        connection.close()
+    claimed = claim([batch_id], wait=False)
+    assert [record["id"] for record in claimed] == [records[0]["id"]]
+
+
+@pytest.mark.integrationtest
+@pytest.mark.parametrize("with_slacks,claimed_batch", [(False, 0), (True, 1)])
+def test_claimReadyJobs_slack(monkeypatch, create_batch, with_slacks,
+                              claimed_batch):
+    """Test that the batch with the least slack of a user is ranked first
+    """
+    monkeypatch.setattr(SCHEDULER, "max_parallel_per_user", 1)
+    batch_ids = [create_batch([1])[0], create_batch([1])[0]]
+    slacks = {batch_ids[1]: 10.0} if with_slacks is True else None
+    claimed = claim(batch_ids, slacks=slacks)
+    assert [record["batch_id"] for record in claimed] == [
+        batch_ids[claimed_batch]]
+
+
+@pytest.mark.integrationtest
+def test_decrementDependentJobs(create_batch):
+    """Test that a dependent job is ready after its last dependency ended
+    if the failed dependencies are tolerated
+    """
+    _, records = create_batch(
+        [1, 1, 1, 1], dependencies=[[], [], [0, 1], [0, 1]])
+    with jobdb:
+        Job.update(deps_failures_allowed=1).where(
+            Job.id == records[3]["id"]).execute()
+    jobdb.close()
+    assert decrementDependentJobs(records[0]["id"], failed=True) == []
+    ready = decrementDependentJobs(records[1]["id"])
+    assert [record["id"] for record in ready] == [records[3]["id"]]
+    job = getJobById(records[2]["id"])[0]
+    assert job["deps_remaining"] == 0
+    assert job["deps_failed"] == 1
+
+
+@pytest.mark.integrationtest
+@pytest.mark.parametrize("min_success_ratio,num_ready", [(None, 0), (0.5, 1)])
+def test_decrementBlockBarrier(create_batch, min_success_ratio, num_ready):
+    """Test that the next block is ready after the last job of a block
+    ended if its failed jobs are tolerated
+    """
+    batch_id, records = create_batch(
+        [1, 1, 2], block_sizes={1: 2, 2: 1},
+        min_success_ratio=min_success_ratio)
+    assert decrementBlockBarrier(batch_id, 1, failed=True) == []
+    ready = decrementBlockBarrier(batch_id, 1)
+    assert [record["id"] for record in ready] == [
+        records[2]["id"]] * num_ready
+    job = getJobById(records[2]["id"])[0]
+    assert job["deps_remaining"] == 0
+    assert job["deps_failed"] == 1
+    # the last block has no next block
+    assert decrementBlockBarrier(batch_id, 2) == []
+
+
+@pytest.mark.integrationtest
+def test_decrementBlockBarrier_without_blocks(create_batch):
+    """Test that batches without block barriers are recognized
+    """
+    batch_id, _ = create_batch([1, 2], dependencies=[[], [0]])
+    assert decrementBlockBarrier(batch_id, 1) is None
+
+
+@pytest.mark.integrationtest
+def test_resetBatchJobs(create_batch):
+    """Test that the unsuccessful jobs are reset with their open
+    dependencies counted again
+    """
+    batch_id, records = create_batch(
+        [1, 2, 1], dependencies=[[], [0], []])
+    ids = [record["id"] for record in records]
+    updateJobByID(ids[0], "error", {}, "resource_id-0")
+    updateJobByID(ids[1], "terminated", {}, "resource_id-1")
+    updateJobByID(ids[2], "finished", {}, "resource_id-2")
+    reset = resetBatchJobs(batch_id)
+    assert sorted(record["id"] for record in reset) == ids[:2]
+    jobs = {jobid: getJobById(jobid)[0] for jobid in ids}
+    assert jobs[ids[0]]["status"] == "PREPARING"
+    assert jobs[ids[0]]["deps_remaining"] == 0
+    assert jobs[ids[0]]["resource_id"] is None
+    assert jobs[ids[1]]["status"] == "PREPARING"
+    assert jobs[ids[1]]["deps_remaining"] == 1
+    assert jobs[ids[2]]["status"] == "SUCCESS"
+
+
+@pytest.mark.integrationtest
+def test_resetBatchJobs_blocks(create_batch):
+    """Test that the block counters are reset to the unfinished jobs
+    """
+    batch_id, records = create_batch(
+        [1, 1, 2], block_sizes={1: 2, 2: 1})
+    ids = [record["id"] for record in records]
+    updateJobByID(ids[0], "finished", {}, "resource_id-0")
+    updateJobByID(ids[1], "error", {}, "resource_id-1")
+    decrementBlockBarrier(batch_id, 1)
+    decrementBlockBarrier(batch_id, 1, failed=True)
+    terminatePreparingJobs(batch_id)
+    reset = resetBatchJobs(batch_id)
+    assert sorted(record["id"] for record in reset) == ids[1:]
+    assert getJobById(ids[1])[0]["deps_remaining"] == 0
+    assert getJobById(ids[2])[0]["deps_remaining"] == 1
+    with jobdb:
+        blocks = list(BatchBlock.select(
+            BatchBlock.batch_processing_block, BatchBlock.jobs_remaining,
+            BatchBlock.jobs_failed
+        ).where(BatchBlock.batch_id == batch_id).order_by(
+            BatchBlock.batch_processing_block).tuples())
+    jobdb.close()
+    assert blocks == [(1, 1, 0), (2, 1, 0)]
+
+
+@pytest.mark.integrationtest
+def test_resetBatchJobs_active(create_batch):
+    """Test that nothing is reset while a job of the batch is active
+    """
+    batch_id, records = create_batch([1, 1])
+    updateJobByID(records[0]["id"], "accepted", {}, "resource_id-0")
+    updateJobByID(records[1]["id"], "error", {}, "resource_id-1")
+    assert resetBatchJobs(batch_id) is None
+    assert getJobById(records[1]["id"])[0]["status"] == "ERROR"
+
+
+@pytest.mark.integrationtest
+def test_terminatePreparingJobs(create_batch):
+    """Test that only the jobs which are not started yet are terminated
+    """
+    batch_id, records = create_batch([1, 1, 2], dependencies=[[], [], [0]])
+    ids = [record["id"] for record in records]
+    updateJobByID(ids[0], "accepted", {}, "resource_id-0")
+    terminated = terminatePreparingJobs(batch_id)
+    assert sorted(record["id"] for record in terminated) == ids[1:]
+    assert all(record["status"] == "TERMINATED" for record in terminated)
+    assert all(record["time_ended"] is not None for record in terminated)
+    assert getJobById(ids[0])[0]["status"] == "PENDING"
+    # the terminated jobs are not claimed anymore
+    assert claim([batch_id]) == []
@@ -26,9 +26,24 @@ __maintainer__ = "mundialis GmbH % Co. KG"
 
 import pytest
 import datetime
-from actinia_parallel_plugin.core.batches import checkProcessingBlockFinished
+import pickle
+from unittest.mock import MagicMock
+from actinia_parallel_plugin.core import batches
+from actinia_parallel_plugin.core.batches import (
+    _estimate_slacks,
+    _get_resource_key,
+    _get_retry_delay,
+    _select_jobs_to_release,
+    _set_resource_entries,
+    assignDependencies,
+    checkBatch,
+    checkProcessingBlockFinished,
+)
 
+from actinia_core.core.kvdb_resources import KvdbResourceInterface
+from actinia_core.core.resources_logger import ResourceLogger
 from actinia_core.version import init_versions, G_VERSION
+from actinia_parallel_plugin.resources.config import SCHEDULER
 
 project_url_part = "projects"
 # set project_url_part to "locations" if GRASS GIS version < 8.4
@@ -183,3 +198,342 @@ def test_checkProcessingBlockFinished(block, ref_out):
     assert (
         out is ref_out
     ), f"Wrong result from transform_input for block {block}"
+
+
+dag_jobs = [
+    {"id": "a"},
+    {"id": "b"},
+    {"id": "c", "depends_on": ["a"]},
+    {"id": "d", "depends_on": ["c", "b"]},
+]
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize(
+    "input_jobs,ref_deps,ref_blocks",
+    [
+        (dag_jobs, [[], [], [0], [1, 2]], [1, 1, 2, 3]),
+    ],
+)
+def test_assignDependencies(input_jobs, ref_deps, ref_blocks):
+    """Test for assignDependencies function."""
+
+    jobs = [dict(job) for job in input_jobs]
+    deps, error = assignDependencies(jobs)
+    assert error is None, "Error from assignDependencies for valid jobs"
+    blocks = [job["batch_processing_block"] for job in jobs]
+    assert deps == ref_deps, "Wrong dependencies from assignDependencies"
+    assert blocks == ref_blocks, "Wrong blocks from assignDependencies"
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize(
+    "input_jobs,ref_error",
+    [
+        ([{"id": "a", "depends_on": ["b"]}, {"id": "b", "depends_on": ["a"]}],
+         "cycle"),
+        ([{"id": "a", "depends_on": ["z"]}], "unknown job id 'z'"),
+        ([{"id": "a"}, {"id": "a", "depends_on": ["a"]}], "not unique"),
+        ([{"id": "a", "parallel": "true"}, {"id": "b", "depends_on": ["a"]}],
+         "parallel"),
+    ],
+)
+def test_assignDependencies_invalid(input_jobs, ref_error):
+    """Test for assignDependencies function with invalid dependencies."""
+
+    deps, error = assignDependencies(input_jobs)
+    assert deps is None, "Dependencies from assignDependencies for invalid jobs"
+    assert ref_error in error, "Wrong error from assignDependencies"
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize(
+    "bpc,ref_error",
+    [
+        ({"jobs": []}, "no jobs"),
+        ({"jobs": "a"}, "Invalid Batch Processing Chain"),
+        ({"jobs": [{"id": "a", "list": [], "depends_on": ["b"]},
+                   {"id": "b", "list": [], "depends_on": ["a"]}]}, "cycle"),
+        ({"jobs": [{"id": "a", "list": [], "depends_on": ["z"]}]},
+         "unknown job id"),
+        ({"jobs": [{"list": []}],
+          "retry": {"max_attempts": 2, "errors": ["timed out", "("]}},
+         "Invalid error pattern ("),
+        ({"jobs": [{"list": [], "retry": {"max_attempts": 2,
+                                          "errors": ["[a-"]}}]},
+         "Invalid error pattern [a-"),
+    ],
+)
+def test_checkBatch_invalid(bpc, ref_error):
+    """Test for checkBatch function with invalid batches."""
+
+    batch, error = checkBatch(bpc)
+    assert batch is None, "Batch from checkBatch for invalid BPC"
+    assert error["status"] == 400, "Wrong status from checkBatch"
+    assert ref_error in error["msg"], "Wrong error from checkBatch"
+
+
+@pytest.mark.unittest
+def test_checkBatch():
+    """Test for checkBatch function."""
+
+    job = {"list": [], "parallel": "true"}
+    batch, error = checkBatch(
+        {"jobs": [job, job, {"list": []}], "priority": 2,
+         "min_success_ratio": 0.5})
+    assert error is None, "Error from checkBatch for valid BPC"
+    assert batch["dependencies"] is None, "Wrong dependencies from checkBatch"
+    assert batch["block_sizes"] == {1: 2, 2: 1}, "Wrong blocks from checkBatch"
+    assert batch["options"] == {"priority": 2}, "Wrong options from checkBatch"
+    assert all(job["min_success_ratio"] == 0.5 for job in batch["jobs"]), \
+        "Wrong min_success_ratio from checkBatch"
+
+
+def _ready_jobs(user_id, batch_id, job_ids, max_parallel=0, priority=0):
+    """Create the ready jobs of a batch as read by claimReadyJobs."""
+
+    return [
+        {
+            "id": job_id,
+            "batch_id": batch_id,
+            "user_id": user_id,
+            "max_parallel": max_parallel,
+            "priority": priority,
+        }
+        for job_id in job_ids
+    ]
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize(
+    "limits,active_counts,ready_jobs,ref_job_ids",
+    [
+        # the free slots of max_parallel
+        ((3, 0, 0), {("u1", 1): 1}, _ready_jobs("u1", 1, range(10, 15)),
+         [10, 11]),
+        ((2, 0, 0), {("u1", 1): 2}, _ready_jobs("u1", 1, range(10, 15)), []),
+        # max_parallel_per_user, the user without active jobs is first
+        ((0, 2, 0), {("u1", 1): 1},
+         _ready_jobs("u1", 1, range(10, 15))
+         + _ready_jobs("u2", 2, range(20, 23)),
+         [20, 10, 21]),
+        # max_parallel_per_batch and max_parallel of a batch
+        ((0, 0, 2), {},
+         _ready_jobs("u1", 1, range(10, 15))
+         + _ready_jobs("u1", 2, range(20, 23), max_parallel=1),
+         [10, 20, 11]),
+    ],
+)
+def test_select_jobs_to_release_limits(
+        monkeypatch, limits, active_counts, ready_jobs, ref_job_ids):
+    """Test the concurrency limits of _select_jobs_to_release."""
+
+    max_parallel, per_user, per_batch = limits
+    monkeypatch.setattr(SCHEDULER, "max_parallel", max_parallel)
+    monkeypatch.setattr(SCHEDULER, "max_parallel_per_user", per_user)
+    monkeypatch.setattr(SCHEDULER, "max_parallel_per_batch", per_batch)
+    monkeypatch.setattr(SCHEDULER, "shares", dict())
+    job_ids = _select_jobs_to_release(active_counts, ready_jobs)
+    assert job_ids == ref_job_ids, \
+        "Wrong jobs from _select_jobs_to_release"
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize(
+    "shares,active_counts,ready_jobs,ref_job_ids",
+    [
+        # the free slots are shared according to the shares of the users
+        ({"u1": 3}, {},
+         _ready_jobs("u1", 1, range(10, 20))
+         + _ready_jobs("u2", 2, range(20, 30)),
+         [10, 20, 11, 12]),
+        ({}, {},
+         _ready_jobs("u1", 1, range(10, 20))
+         + _ready_jobs("u2", 2, range(20, 30)),
+         [10, 20, 11, 21]),
+        # active jobs count against the share of their user
+        ({}, {("u1", 1): 2},
+         _ready_jobs("u1", 1, range(10, 20))
+         + _ready_jobs("u2", 2, range(20, 30)),
+         [20, 21]),
+        # a small batch does not wait behind a large batch of the user
+        ({}, {},
+         _ready_jobs("u1", 1, range(10, 20)) + _ready_jobs("u1", 3, [30]),
+         [10, 30, 11, 12]),
+    ],
+)
+def test_select_jobs_to_release_fair_share(
+        monkeypatch, shares, active_counts, ready_jobs, ref_job_ids):
+    """Test the weighted fair queuing of _select_jobs_to_release."""
+
+    monkeypatch.setattr(SCHEDULER, "max_parallel", 4)
+    monkeypatch.setattr(SCHEDULER, "max_parallel_per_user", 0)
+    monkeypatch.setattr(SCHEDULER, "max_parallel_per_batch", 0)
+    monkeypatch.setattr(SCHEDULER, "shares", shares)
+    job_ids = _select_jobs_to_release(active_counts, ready_jobs)
+    assert job_ids == ref_job_ids, \
+        "Wrong jobs from _select_jobs_to_release"
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize(
+    "slacks,ready_jobs,ref_job_ids",
+    [
+        # a batch with a higher priority is started first
+        (None,
+         _ready_jobs("u1", 1, range(10, 20))
+         + _ready_jobs("u2", 2, range(20, 30), priority=1),
+         [20, 21, 22, 23]),
+        # then the batch with the least slack until its deadline
+        ({1: 3600.0, 2: 60.0},
+         _ready_jobs("u1", 1, range(10, 20))
+         + _ready_jobs("u2", 2, range(20, 30)),
+         [20, 21, 22, 23]),
+        # batches without deadline after the batches with a deadline
+        ({2: 60.0},
+         _ready_jobs("u1", 1, range(10, 12))
+         + _ready_jobs("u2", 2, range(20, 22)),
+         [20, 21, 10, 11]),
+        ({2: -60.0},
+         _ready_jobs("u1", 1, range(10, 20), priority=1)
+         + _ready_jobs("u2", 2, range(20, 30)),
+         [10, 11, 12, 13]),
+    ],
+)
+def test_select_jobs_to_release_priority(
+        monkeypatch, slacks, ready_jobs, ref_job_ids):
+    """Test the priority and deadline order of _select_jobs_to_release."""
+
+    monkeypatch.setattr(SCHEDULER, "max_parallel", 4)
+    monkeypatch.setattr(SCHEDULER, "max_parallel_per_user", 0)
+    monkeypatch.setattr(SCHEDULER, "max_parallel_per_batch", 0)
+    monkeypatch.setattr(SCHEDULER, "shares", dict())
+    job_ids = _select_jobs_to_release(dict(), ready_jobs, slacks)
+    assert job_ids == ref_job_ids, \
+        "Wrong jobs from _select_jobs_to_release"
+
+
+@pytest.mark.unittest
+def test_estimate_slacks(monkeypatch):
+    """Test for _estimate_slacks function."""
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    progress = [
+        # 3 blocks left with jobs of 100 seconds
+        {"batch_id": 1, "deadline": now + datetime.timedelta(hours=1),
+         "avg_duration": 100.0, "first_block": 2, "last_block": 4},
+        # no finished jobs yet, the average of all batches is used
+        {"batch_id": 2, "deadline": now + datetime.timedelta(minutes=10),
+         "avg_duration": None, "first_block": 1, "last_block": 1},
+    ]
+    monkeypatch.setattr(batches, "getDeadlineBatchProgress", lambda: progress)
+    monkeypatch.setattr(batches, "getAverageJobDuration", lambda: 200.0)
+    slacks = _estimate_slacks()
+    assert slacks.keys() == {1, 2}, "Wrong batches from _estimate_slacks"
+    assert slacks[1] == pytest.approx(3300, abs=5), \
+        "Wrong slack from _estimate_slacks"
+    assert slacks[2] == pytest.approx(400, abs=5), \
+        "Wrong slack from _estimate_slacks"
+
+    monkeypatch.setattr(batches, "getDeadlineBatchProgress", lambda: [])
+    assert _estimate_slacks() == dict(), \
+        "Wrong slacks from _estimate_slacks without deadlines"
+
+
+retry_policy = {
+    "max_attempts": 3,
+    "backoff": 10,
+    "backoff_factor": 2,
+    "errors": ["Connection timed out", "Stale file handle"],
+}
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize(
+    "policy,attempts,message,ref_delay",
+    [
+        (retry_policy, 1, "Error: Connection timed out", 10),
+        (retry_policy, 2, "Stale file handle of /mnt/data", 20),
+        (retry_policy, 3, "Connection timed out", None),
+        (retry_policy, 1, "Module r.slope.aspect failed", None),
+        ({"max_attempts": 4, "errors": []}, 3, "any error", 40),
+        ({"max_attempts": 2, "backoff": 5, "backoff_factor": 1}, 1, "", 5),
+        ({"max_attempts": 2, "errors": ["^Connection"]}, 1, "No Connection",
+         None),
+        ({"max_attempts": 2, "errors": ["Connection (timed"]}, 1,
+         "Connection timed out", None),
+        (None, 1, "Connection timed out", None),
+    ],
+)
+def test_get_retry_delay(policy, attempts, message, ref_delay):
+    """Test for the error matching and the backoff of _get_retry_delay."""
+
+    delay = _get_retry_delay(policy, attempts, message)
+    assert delay == ref_delay, "Wrong delay from _get_retry_delay"
+
+
+def _get_resource_logger_without_kvdb():
+    """Create a ResourceLogger whose KVDB server records the calls."""
+
+    resource_logger = ResourceLogger.__new__(ResourceLogger)
+    resource_logger.db = KvdbResourceInterface()
+    resource_logger.db.kvdb_server = MagicMock()
+    resource_logger.send_to_logger = MagicMock()
+    return resource_logger
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize("iteration", [None, 1, 2])
+@pytest.mark.parametrize(
+    "termination,prefix",
+    [
+        (False, KvdbResourceInterface.resource_id_prefix),
+        (True, KvdbResourceInterface.resource_id_termination_prefix),
+    ],
+)
+def test_get_resource_key(iteration, termination, prefix):
+    """Test that _get_resource_key has the key layout of the installed
+    actinia-core."""
+
+    ref_key = prefix + ResourceLogger._generate_db_resource_id(
+        "actinia-gdi", resource_id1, iteration)
+    key = _get_resource_key("actinia-gdi", resource_id1, iteration,
+                            termination)
+    assert key == ref_key, "Wrong key from _get_resource_key"
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize("iteration", [None, 1, 2])
+def test_set_resource_entries(iteration):
+    """Test that _set_resource_entries writes the same entries as
+    ResourceLogger.commit."""
+
+    resource_logger = _get_resource_logger_without_kvdb()
+    document = pickle.dumps((200, {"status": "accepted"}))
+    resource_logger.commit(
+        "actinia-gdi", resource_id1, iteration, document, 60)
+    connection = MagicMock()
+    _set_resource_entries(
+        connection,
+        [("actinia-gdi", resource_id1, iteration, document)], 60)
+    assert (
+        connection.pipeline.return_value.setex.call_args
+        == resource_logger.db.kvdb_server.setex.call_args
+    ), "Wrong resource entry from _set_resource_entries"
+
+
+@pytest.mark.unittest
+def test_set_resource_entries_termination():
+    """Test that _set_resource_entries writes the same termination entries
+    as ResourceLogger.commit_termination."""
+
+    resource_logger = _get_resource_logger_without_kvdb()
+    resource_logger.commit_termination("actinia-gdi", resource_id1)
+    connection = MagicMock()
+    _set_resource_entries(
+        connection, [("actinia-gdi", resource_id1, None, 1)], 3600,
+        termination=True)
+    assert (
+        connection.pipeline.return_value.setex.call_args
+        == resource_logger.db.kvdb_server.setex.call_args
+    ), "Wrong termination entry from _set_resource_entries"
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2022 mundialis GmbH & Co. KG
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Unit tests for the parsing of the plugin configuration
+"""
+
+__license__ = "GPLv3"
+__author__ = "Anika Weinmann"
+__copyright__ = "Copyright 2022 mundialis GmbH & Co. KG"
+__maintainer__ = "mundialis GmbH % Co. KG"
+
+import pytest
+from actinia_parallel_plugin.resources import config
+from actinia_parallel_plugin.resources.config import (
+    JOBTABLE,
+    SCHEDULER,
+    Configfile,
+    _parseShares,
+)
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize(
+    "shares,ref_shares",
+    [
+        ("user1:4, user2:1", {"user1": 4.0, "user2": 1.0}),
+        ("user1:0.5,", {"user1": 0.5}),
+        ("", dict()),
+    ],
+)
+def test_parseShares(shares, ref_shares):
+    """Test for _parseShares function."""
+
+    assert _parseShares(shares) == ref_shares, \
+        "Wrong shares from _parseShares"
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize(
+    "shares",
+    ["user1", "user1:0", "user1:-2", ":3", "user1:many", "user1:inf",
+     "user1:nan"],
+)
+def test_parseShares_invalid(shares):
+    """Test for _parseShares function with invalid shares."""
+
+    with pytest.raises(ValueError):
+        _parseShares(shares)
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize(
+    "options,ref_pool_size,ref_start_threads",
+    [
+        ("[SCHEDULER]\nstart_threads = 4\n", 8, 4),
+        ("[JOBTABLE]\npool_size = 4\n[SCHEDULER]\nstart_threads = 8\n",
+         4, 3),
+        ("[JOBTABLE]\npool_size = 1\n", 1, 1),
+    ],
+)
+def test_Configfile_start_threads(tmp_path, monkeypatch, options,
+                                  ref_pool_size, ref_start_threads):
+    """Test that Configfile limits start_threads by the jobtable pool."""
+
+    config_file = tmp_path / "actinia.cfg"
+    config_file.write_text(options)
+    monkeypatch.setattr(config, "CONFIG_FILES", [str(config_file)])
+    monkeypatch.setattr(
+        config, "GENERATED_CONFIG", str(tmp_path / "generated.cfg"))
+    monkeypatch.setattr(JOBTABLE, "pool_size", 8)
+    monkeypatch.setattr(SCHEDULER, "start_threads", 4)
+    Configfile()
+    assert JOBTABLE.pool_size == ref_pool_size, "Wrong pool_size"
+    assert SCHEDULER.start_threads == ref_start_threads, \
+        "Wrong start_threads"
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2022 mundialis GmbH & Co. KG
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Unit tests for the jobtable functions which do not need the database
+"""
+
+__license__ = "GPLv3"
+__author__ = "Anika Weinmann"
+__copyright__ = "Copyright 2022 mundialis GmbH & Co. KG"
+__maintainer__ = "mundialis GmbH % Co. KG"
+
+import pytest
+from actinia_parallel_plugin.core.jobtable import _getDepsFailuresAllowed
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize(
+    "num_deps,ratio,ref_allowed",
+    [
+        (10, None, 0),
+        (10, 1.0, 0),
+        (0, 0.5, 0),
+        (10, 0.9, 1),
+        # 0.07 * 100 is 7.000000000000001 as float
+        (100, 0.07, 93),
+        (100, 0.99, 1),
+        (3, 0.5, 1),
+        (7, 0.7, 2),
+        (200, 0.995, 1),
+        (10, 0.0, 10),
+    ],
+)
+def test_getDepsFailuresAllowed(num_deps, ratio, ref_allowed):
+    """Test for the rounding of _getDepsFailuresAllowed."""
+
+    allowed = _getDepsFailuresAllowed(num_deps, ratio)
+    assert allowed == ref_allowed, \
+        f"Wrong number of allowed failures for {num_deps} jobs and {ratio}"